@@ -1,4 +1,3 @@
-import contextlib
 import os
 os.environ['KIVY_GL_BACKEND'] = 'sdl2'
 
@@ -23,27 +22,28 @@ from kivymd.uix.menu import MDDropdownMenu
 from kivymd.uix.appbar import MDActionTopAppBarButton
 from kivymd.uix.label import MDLabel
 from kivymd.uix.snackbar import MDSnackbar, MDSnackbarText
-from kivymd.uix.fitimage import FitImage
 from kivymd.uix.card import MDCard
 from kivy.uix.widget import Widget
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.utils import platform
 from kivy.core.window import Window
 from kivy.uix.scrollview import ScrollView
 from kivymd.uix.list import (
     MDList, MDListItem, MDListItemLeadingIcon,
     MDListItemHeadlineText, MDListItemSupportingText,
-    MDListItemTertiaryText
+    MDListItemTertiaryText, MDListItemTrailingCheckbox
 )
 from kivy.uix.screenmanager import SlideTransition
 from kivymd.uix.tooltip import MDTooltip
-from managers import DocumentManager, UserManager, VisitorManager
-from models import User
-from helpers import resource_path, setup_logger
+from managers import DocumentManager, UserManager, VisitorManager, ShareListener, get_database, push_disponible
+from models import ShareInboxItem
+from helpers import resource_path, setup_logger, DocumentCache, ImageIngestion, ThumbnailCache, WatermarkStore
+from helpers.thumbnails import THUMBNAIL_SIZE
+from helpers.image_loader import AsyncImageLoader
+from helpers.background import BackgroundRunner
+from helpers.image_worker import ImageWorkerPool
 import sys
 from datetime import datetime, timezone
-from PIL import Image
-from pathlib import Path
-import tempfile
 from plyer import filechooser, notification
 import tkinter as _tk
 from tkinter import filedialog as _fd
@@ -59,6 +59,9 @@ from kivy.factory import Factory
 
 __version__ = "1.0.0"
 
+# Taille maximale de l'image décodée pour l'écran de détail
+DETAIL_IMAGE_SIZE = (1600, 1600)
+
 logger = setup_logger()
 
 class MainScreen(MDScreen):
@@ -71,22 +74,25 @@ class MainScreen(MDScreen):
     def accept_share(self, share_id):
         """Accepte un partage de visiteur. Et ajoute le visiteur à la liste."""
         app = MDApp.get_running_app()
-        try:
-            response = app.visitor_manager.accept_share(share_id)
+        
+        def on_success(response):
             if not response:
                 app.show_error_dialog("Le partage est déjà révoqué ou n'existe pas.")
                 return
-        except Exception as e:
-            app.show_error_dialog("Erreur lors de l'acceptation du partage")
-            logger.error(f"L'erreur suivante vient de se produire {e}")
-            return
-        
-        if self.menu:
-            self.menu.dismiss()
             
-        self.dialog.dismiss()
-        app.show_info_snackbar("Partage accepté. Le visiteur ajouté à votre liste.", str(share_id))
-        app.afficher_heros_visiteurs()
+            if self.menu:
+                self.menu.dismiss()
+                
+            self.dialog.dismiss()
+            app.show_info_snackbar("Partage accepté. Le visiteur ajouté à votre liste.", str(share_id))
+            app.inserer_carte_visiteur(response)
+            app.rafraichir_badges()
+        
+        app.en_arriere_plan(
+            app.visitor_manager.accept_share, share_id,
+            on_success=on_success,
+            erreur="Erreur lors de l'acceptation du partage",
+        )
         
     def open_share_menu(self, share_id):
         """Ouvre le menu contextuel pour un partage donné."""
@@ -115,12 +121,8 @@ class MainScreen(MDScreen):
     def open_notifications(self):
         """Ouvre un dialogue listant les notifications par ordre d’arrivée."""
         app = MDApp.get_running_app()
-        user_id = app.user.id
-        shares = app.visitor_manager.get_active_shares_for_user(user_id)
-        shares_sorted = sorted(shares, key=lambda s: s.shared_at)
         
         def format_share(share):
-            shared_by_user = MDApp.get_running_app().user_manager.get_user_by_id(share.shared_by_user_id)
             ts = share.shared_at.strftime("%d/%m/%Y %H:%M")
             content =  MDListItem(
                 MDListItemLeadingIcon(
@@ -130,7 +132,7 @@ class MainScreen(MDScreen):
                     text="Vous avez un nouveau partage",
                 ),
                 MDListItemSupportingText(
-                    text=f"De la part de {shared_by_user.nom} {shared_by_user.prenom} le {ts}",
+                    text=f"De la part de {share.expediteur_nom} {share.expediteur_prenom} le {ts}",
                 ),
                 divider = True,
                 theme_bg_color="Custom",
@@ -144,29 +146,39 @@ class MainScreen(MDScreen):
             content.add_widget(icon)
             return content
         
-        app.open_share_dialog("Visiteur partagé avec vous", shares_sorted, format_share)
+        # Déjà triés par date de partage, expéditeur inclus
+        app.en_arriere_plan(
+            app.visitor_manager.get_inbox_for_user, app.user.id, statuts=("active",),
+            on_success=lambda shares: app.open_share_dialog("Visiteur partagé avec vous", shares, format_share),
+            erreur="Erreur lors du chargement des notifications.",
+        )
         
     def refuse_share(self, share_id):
         """Refuse un partage de visiteur."""
         app = MDApp.get_running_app()
-        try:
-            response = app.visitor_manager.revoke_share(share_id)
+        
+        def on_success(response):
             if not response:
                 app.show_error_dialog("Le partage est déjà révoqué ou n'existe pas.")
                 return
-        except Exception as e:
-            app.show_error_dialog("Erreur lors du refus du partage")
-            logger.error(f"L'erreur suivante vient de se produire {e}")
-            return
-        
-        self.menu.dismiss()
-        self.dialog.dismiss()
+            
+            self.menu.dismiss()
+            self.dialog.dismiss()
+            
+            app.show_info_snackbar("Partage refusé.", str(share_id))
+            app.rafraichir_badges()
         
-        app.show_info_snackbar("Partage refusé.", str(share_id))
+        app.en_arriere_plan(
+            app.visitor_manager.revoke_share, share_id,
+            on_success=on_success,
+            erreur="Erreur lors du refus du partage",
+        )
         
 class DetailScreen(MDScreen):
     def on_leave(self, *args):
-        self.ids.image.source = ""
+        app = MDApp.get_running_app()
+        app.annuler_traitement_image()
+        app.afficher_image_detail("")
         self.ids.phone_number.text = ""
         self.ids.place_of_birth.text = ""
         self.ids.motif.text = ""
@@ -178,10 +190,8 @@ class DetailScreen(MDScreen):
         self.ids.btn_delete.disabled = False
         self.ids.btn_share.disabled = False
         
-        app = MDApp.get_running_app()
         app.selected_image_path = ""
         app.visiteur = None
-        app.afficher_heros_visiteurs()
    
 class AccountScreen(MDScreen):
     def enable_butons(self):
@@ -240,16 +250,18 @@ class AccountScreen(MDScreen):
             return app.show_error_dialog("Aucune modification détectée.")
 
         # Appel au UserManager (décompactage des kwargs)
-        try:
+        def enregistrer():
             app.user_manager.update_user(user.id, **params)
-            app.user = app.user_manager.get_user_by_email(email)
+            return app.user_manager.get_user_by_email(email)
+        
+        def on_success(utilisateur):
+            app.user = utilisateur
             app.show_info_snackbar("Profil mis à jour avec succès.", str(user.id))
             
             # On recharge l’affichage et on désactive à nouveau
             self.populate_fields()
-        except ValueError as e:
-            app.show_error_dialog("Une erreur s'est produite")
-            logger.error(f"L'erreur suivante vient de se produire {e}")
+        
+        app.en_arriere_plan(enregistrer, on_success=on_success, erreur="Une erreur s'est produite")
     
     def annuler_modification_utilisateur(self):
         self.populate_fields()
@@ -334,14 +346,73 @@ class TooltipMDIconButton(MDTooltip, MDIconButton):
 
 class ToolMDActionButton(MDTooltip, MDActionTopAppBarButton):
     texte = StringProperty()
+
+class VisitorCard(RecycleDataViewBehavior, MDCard):
+    """
+    Carte de la grille des visiteurs. Les instances sont recyclées par le
+    RecycleView : seules les cartes visibles existent et elles sont
+    réaffectées à partir des dictionnaires de `ids.box.data`.
+    La carte affiche la miniature de `image_path`, jamais l'image complète ;
+    elle est décodée en arrière-plan et la demande est annulée si la carte
+    sort de l'écran avant la fin du chargement.
+    """
+    visitor_id = ObjectProperty(None, allownone=True)
+    image_path = StringProperty("")
+    label = StringProperty("")
+    label_halign = StringProperty("left")
+
+    def __init__(self, **kwargs):
+        self._requete_image = None
+        super().__init__(**kwargs)
+
+    def refresh_view_attrs(self, rv, index, data):
+        super().refresh_view_attrs(rv, index, data)
+        self._charger_image()
+
+    def on_parent(self, instance, parent):
+        # Carte retirée du RecycleView : inutile de finir le chargement
+        if parent is None and self._requete_image and not self._requete_image.done:
+            self._requete_image.cancel()
+            self._requete_image = None
+
+    def _charger_image(self):
+        requete = self._requete_image
+        if requete and requete.path == self.image_path and not requete.cancelled:
+            return
+        if requete:
+            requete.cancel()
+        
+        # Carte vierge en attendant la miniature
+        self.ids.image.texture = None
+        app = MDApp.get_running_app()
+        self._requete_image = app.image_loader.load(
+            self.image_path,
+            self._afficher_image,
+            max_size=THUMBNAIL_SIZE,
+            transform=app.thumbnails.get,
+        ) if self.image_path else None
+
+    def _afficher_image(self, texture):
+        self.ids.image.texture = texture
         
 class Gestion(MDApp):
     visiteur = ObjectProperty(None, allownone=True)
+    # Vrai tant qu'une opération d'arrière-plan non silencieuse est en cours
+    chargement = BooleanProperty(False)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.visitor_manager = VisitorManager()
         self.user_manager = UserManager()
         self.document_manager = DocumentManager()
+        self.thumbnails = ThumbnailCache()
+        # Images d'identité normalisées et fusionnées avant enregistrement, hors thread Kivy
+        self.images = ImageWorkerPool(ImageIngestion())
+        # Documents déjà ouverts, rouverts sans nouveau téléchargement
+        self.documents_cache = DocumentCache()
+        self.image_loader = AsyncImageLoader()
+        self.taches = BackgroundRunner()
+        self.taches.bind(pending=lambda instance, n: setattr(self, "chargement", n > 0))
+        self._requete_image_detail = None
         self.icon = resource_path("pictures/logo1.jpg")
         self.title = "GestionVisiteurs"
         self.dialog = None
@@ -353,69 +424,141 @@ class Gestion(MDApp):
             position="bottom",
             width=dp(300),
         )
-        self._notified_share_ids = set()
-        self._notified_doc_ids = set()
+        self.watermarks = WatermarkStore()
+        # Dernier partage notifié par type, persisté par utilisateur
+        self._reperes_partages = {"visiteur": 0, "document": 0}
+        # Derniers compteurs affichés dans les badges
+        self.compteurs_partages = {}
         self._notify_poll_interval = 10
+        self._ecouteur_partages = None
+        self._evenement_poll = None
+        self._curseur_visiteurs = None
+        self._filtre_visiteurs = {}
+        self._cartes_visiteurs = {}
+        self._tache_visiteurs = None
+        self._tache_detail = None
+        self._tache_image = None
+        
+    def en_arriere_plan(self, fonction, *args, on_success=None, on_error=None,
+                        erreur="Une erreur s'est produite.", silent=False, **kwargs):
+        """
+        Exécute `fonction(*args, **kwargs)` hors du thread Kivy (base de données, SMTP, réseau).
+        `on_success(resultat)` est appelé dans la boucle Kivy. En cas d'exception,
+        `on_error(exception)` si fourni, sinon l'erreur est journalisée et `erreur` affiché.
+        :return: la tâche, annulable avec cancel()
+        """
+        if on_error is None:
+            def on_error(e):
+                logger.error(f"L'erreur suivante vient de se produire {e}")
+                if erreur:
+                    self.show_error_dialog(erreur)
         
+        return self.taches.submit(fonction, *args, on_success=on_success, on_error=on_error, silent=silent, **kwargs)
+    
     def activer_boutons_modification(self):
         screen = self.root.get_screen("screen B")
         screen.ids.btn_cancel.disabled = False
-        screen.ids.btn_save.disabled = False
+        # Pas d'enregistrement tant que l'image choisie n'est pas prête
+        screen.ids.btn_save.disabled = self._tache_image is not None
     
-    def afficher_heros_visiteurs(self, visiteurs=None):
-        box = self.root.get_screen("screen A").ids.box
-        box.clear_widgets()
-        
+    def afficher_heros_visiteurs(self, visiteurs=None, curseur=None):
         if visiteurs is None:
-            visiteurs = self.visitor_manager.lister_visiteurs()
-        
-        box.add_widget(   
-            MDCard(
-                FitImage(
-                    source=resource_path("pictures/add-user-icon.jpg"),
-                    size_hint_y=None,
-                    height=dp(200)
-                ),
-                MDLabel(
-                    text="Ajouter un visiteur",
-                    halign="center",
-                    size_hint_y=None,
-                    height=dp(30),
-                    font_size='12sp',
-                ),
-                orientation="vertical",
-                padding=10,
-                ripple_behavior=True,
-                size_hint_y=None,
-                height=dp(250),
-                size_hint_x=0.2,
-                on_release=lambda x: self.show_visitor_details()
-            )
+            # Première page seulement, la suite est chargée au défilement
+            self._charger_visiteurs(self._filtre_visiteurs, lambda page: self.afficher_heros_visiteurs(*page))
+            return
+        
+        screen = self.root.get_screen("screen A")
+        screen.ids.empty_label.text = ""
+        self._curseur_visiteurs = curseur
+        
+        # Le RecycleView ne reçoit que des dictionnaires légers, les cartes sont recyclées
+        self._cartes_visiteurs = {v.id: self._carte_visiteur(v) for v in visiteurs}
+        screen.ids.box.data = [self._carte_ajout(), *self._cartes_visiteurs.values()]
+        Clock.schedule_once(lambda dt: self.on_scroll_visiteurs(screen.ids.box))
+
+    def inserer_carte_visiteur(self, visiteur):
+        """
+        Ajoute la carte d'un visiteur créé sans recharger la grille.
+        Les identifiants étant croissants, la carte va en fin de liste ; si toutes
+        les pages ne sont pas chargées ou qu'un filtre est actif, elle apparaîtra
+        au prochain chargement.
+        """
+        if self._curseur_visiteurs is not None or any(self._filtre_visiteurs.values()):
+            return
+        
+        carte = self._carte_visiteur(visiteur)
+        self._cartes_visiteurs[visiteur.id] = carte
+        self.root.get_screen("screen A").ids.box.data.append(carte)
+
+    def maj_carte_visiteur(self, visiteur):
+        """Remplace la carte d'un visiteur modifié, seule cette vue est rafraîchie."""
+        ancienne = self._cartes_visiteurs.get(visiteur.id)
+        if ancienne is None:
+            return
+        
+        data = self.root.get_screen("screen A").ids.box.data
+        carte = self._carte_visiteur(visiteur)
+        self._cartes_visiteurs[visiteur.id] = carte
+        data[data.index(ancienne)] = carte
+
+    def retirer_carte_visiteur(self, visitor_id):
+        """Retire la carte d'un visiteur supprimé."""
+        if (carte := self._cartes_visiteurs.pop(visitor_id, None)) is not None:
+            self.root.get_screen("screen A").ids.box.data.remove(carte)
+
+    def charger_page_suivante(self):
+        """Ajoute la page suivante de visiteurs à la grille."""
+        if self._curseur_visiteurs is None:
+            return
+        # Une page est déjà en cours de chargement
+        if self._tache_visiteurs and not self._tache_visiteurs.done:
+            return
+        
+        def on_success(page):
+            visiteurs, self._curseur_visiteurs = page
+            cartes = {v.id: self._carte_visiteur(v) for v in visiteurs}
+            self._cartes_visiteurs.update(cartes)
+            rv = self.root.get_screen("screen A").ids.box
+            rv.data.extend(cartes.values())
+            Clock.schedule_once(lambda dt: self.on_scroll_visiteurs(rv))
+        
+        self._charger_visiteurs(self._filtre_visiteurs, on_success, apres_id=self._curseur_visiteurs)
+
+    def _charger_visiteurs(self, filtre, on_success, apres_id=None, on_error=None):
+        """Charge une page de visiteurs en arrière-plan ; une demande plus récente annule la précédente."""
+        if self._tache_visiteurs:
+            self._tache_visiteurs.cancel()
+        self._tache_visiteurs = self.en_arriere_plan(
+            self.visitor_manager.lister_visiteurs_page, apres_id,
+            on_success=on_success,
+            on_error=on_error,
+            erreur="Erreur lors du chargement des visiteurs.",
+            **filtre
         )
-            
-        for visiteur in visiteurs:
-            layout = MDCard(
-                orientation="vertical",
-                padding=10,
-                size_hint_y=None,
-                height=dp(250),
-                size_hint_x=0.2,
-                on_release=lambda x, v=visiteur: self.show_visitor_details(v)
-            )
-            layout.add_widget(FitImage(
-                source=visiteur.image_path,
-                size_hint_y=None,
-                height=dp(200)
-            ))
-            layout.add_widget(MDLabel(
-                text=f"Visiteur {visiteur.id} - N° {visiteur.phone_number}",
-                halign="left",
-                font_size='12sp',
-                size_hint_y=None,
-                height=dp(30),
-            ))
-            
-            box.add_widget(layout)
+
+    def on_scroll_visiteurs(self, rv):
+        """Charge la page suivante quand le bas de la grille approche ou si elle ne remplit pas l'écran."""
+        if self._curseur_visiteurs is None:
+            return
+        layout = rv.layout_manager
+        if layout.height <= rv.height or rv.scroll_y <= 0.1:
+            self.charger_page_suivante()
+
+    def _carte_ajout(self):
+        return {
+            "visitor_id": None,
+            "image_path": resource_path("pictures/add-user-icon.jpg"),
+            "label": "Ajouter un visiteur",
+            "label_halign": "center",
+        }
+
+    def _carte_visiteur(self, visiteur):
+        return {
+            "visitor_id": visiteur.id,
+            "image_path": visiteur.image_path,
+            "label": f"Visiteur {visiteur.id} - N° {visiteur.phone_number}",
+            "label_halign": "left",
+        }
                 
     def animer_bouton(self, bouton):
         anim = Animation(opacity=0.5, duration=0.1) + Animation(opacity=1, duration=0.1)
@@ -506,16 +649,24 @@ class Gestion(MDApp):
         
         def confirmer_suppression():
             vis_id = self.visiteur.id
-            succes, error = self.visitor_manager.supprimer_visiteur(vis_id)
-            if error:
-                self.show_error_dialog(error)
-                return
             
-            self.dialog.dismiss()
-            self.show_info_snackbar("Visiteur supprimé avec succès.", str(vis_id))
+            def on_success(resultat):
+                succes, error = resultat
+                if error:
+                    self.show_error_dialog(error)
+                    return
+                
+                self.dialog.dismiss()
+                self.show_info_snackbar("Visiteur supprimé avec succès.", str(vis_id))
+                
+                self.root.current = "screen A"
+                self.retirer_carte_visiteur(vis_id)
             
-            self.root.current = "screen A"
-            self.afficher_heros_visiteurs()
+            self.en_arriere_plan(
+                self.visitor_manager.supprimer_visiteur, vis_id,
+                on_success=on_success,
+                erreur="Erreur lors de la suppression.",
+            )
         
         # Ouvrir un dialgue de confirmation
         content = MDLabel(
@@ -556,6 +707,9 @@ class Gestion(MDApp):
         return phone
         
     def enregistrer_modifications(self):
+        if self._tache_image is not None:
+            self.show_error_dialog("L'image est en cours de traitement, veuillez patienter.")
+            return
         try:
             screen = self.root.get_screen("screen B")
 
@@ -584,29 +738,47 @@ class Gestion(MDApp):
                 return self.masquer_bouttons(screen)
             if not all([phone_number, place_of_birth, motif, date, arrival_time, exit_time, observation]):
                 return self.show_error_dialog("Tous les champs doivent être remplis pour enregistrer les modifications.")
+            try:
+                date = datetime.strptime(date, "%Y-%m-%d").date()
+                arrival_time = datetime.strptime(arrival_time, "%H:%M").time()
+            except ValueError:
+                return self.show_error_dialog("La date doit être au format AAAA-MM-JJ et l'heure d'arrivée au format HH:MM.")
 
-            success, error = self.visitor_manager.mettre_a_jour_visiteur(
-                self.visiteur.id, image_path=image_path,
-                phone_number=phone_number,
-                place_of_birth=place_of_birth, motif=motif,
-                date=date, arrival_time=arrival_time,
-                exit_time=exit_time, observation=observation
-            )
+            visitor_id = self.visiteur.id
 
-            if not success:
-                self.show_error_dialog(error or "Erreur lors de la mise à jour du visiteur.")
-                return
+            def enregistrer():
+                success, error = self.visitor_manager.mettre_a_jour_visiteur(
+                    visitor_id, image_path=image_path,
+                    phone_number=phone_number,
+                    place_of_birth=place_of_birth, motif=motif,
+                    date=date, arrival_time=arrival_time,
+                    exit_time=exit_time, observation=observation
+                )
+                visiteur = self.visitor_manager.chercher_visiteur(visitor_id) if success else None
+                return success, error, visiteur
+
+            def on_success(resultat):
+                success, error, visiteur = resultat
+                if not success:
+                    self.show_error_dialog(error or "Erreur lors de la mise à jour du visiteur.")
+                    return
 
-            screen.ids.btn_save.disabled = True
-            screen.ids.btn_cancel.disabled = True
-            self.show_info_snackbar("Modifications enregistrées avec succès!", str(self.visiteur.id))
+                self.show_info_snackbar("Modifications enregistrées avec succès!", str(visitor_id))
+                self.maj_carte_visiteur(visiteur)
+                # La fiche a pu être quittée pendant l'enregistrement
+                if self.visiteur is None or self.visiteur.id != visitor_id:
+                    return
 
-            # Rafraîchir l'affichage
-            self.visiteur = self.visitor_manager.chercher_visiteur(self.visiteur.id)
-            self.remplir_champs()
-            self.afficher_heros_visiteurs()
+                screen.ids.btn_save.disabled = True
+                screen.ids.btn_cancel.disabled = True
 
-            self.selected_image_path = ""
+                # Rafraîchir l'affichage
+                self.visiteur = visiteur
+                self.remplir_champs()
+
+                self.selected_image_path = ""
+
+            self.en_arriere_plan(enregistrer, on_success=on_success, erreur="Erreur lors de la modification.")
 
         except Exception as e:
             self.show_error_dialog("Erreur lors de la modification.")
@@ -618,9 +790,21 @@ class Gestion(MDApp):
                 self.show_error_dialog(erreur)
                 return
 
-            self.visitor_manager.ajouter_visiteur(image_path, phone_number, place_of_birth, motif)
-            self.show_info_snackbar("Visiteur ajouté avec succès!")
-            self.root.current = "screen A"
+            def on_success(resultat):
+                visiteur, error = resultat
+                if error:
+                    self.show_error_dialog(error)
+                    return
+                
+                self.inserer_carte_visiteur(visiteur)
+                self.show_info_snackbar("Visiteur ajouté avec succès!")
+                self.root.current = "screen A"
+
+            self.en_arriere_plan(
+                self.visitor_manager.ajouter_visiteur, image_path, phone_number, place_of_birth, motif,
+                on_success=on_success,
+                erreur="Erreur lors de l'ajout.",
+            )
 
         except Exception as e:
             self.show_error_dialog("Erreur lors de l'ajout.")
@@ -662,59 +846,80 @@ class Gestion(MDApp):
             self.show_error_dialog("Aucun numéro fourni. Envoi annulé.")
             return
 
-        # Envoyer via pywhatkit
-        try:
-            self.show_info_snackbar("Préparation de l'envoi WhatsApp... Veuillez patienter.")
-
-            pw.sendwhats_image(
-                receiver=phone,
-                img_path=self.visiteur.image_path,
-                caption=texte,
-                wait_time=15,
-                tab_close=True,
-                close_time=10
-            )
-
-            self.show_info_snackbar("Envoi WhatsApp lancé avec succès. Veuillez vérifier votre navigateur.")
+        # Envoyer via pywhatkit (plusieurs dizaines de secondes, hors du thread Kivy)
+        self.show_info_snackbar("Préparation de l'envoi WhatsApp... Veuillez patienter.")
 
-        except FileNotFoundError as fe:
-            self.show_error_dialog("Erreur : le fichier image est introuvable.")
-            logger.error(f"L'erreur suivante vient de se produire {fe}")
-        except Exception as e:
-            self.show_error_dialog("Erreur lors de l'envoi WhatsApp.")
+        def on_error(e):
+            if isinstance(e, FileNotFoundError):
+                self.show_error_dialog("Erreur : le fichier image est introuvable.")
+            else:
+                self.show_error_dialog("Erreur lors de l'envoi WhatsApp.")
             logger.error(f"L'erreur suivante vient de se produire {e}")
+
+        self.en_arriere_plan(
+            pw.sendwhats_image,
+            receiver=phone,
+            img_path=self.visiteur.image_path,
+            caption=texte,
+            wait_time=15,
+            tab_close=True,
+            close_time=10,
+            on_success=lambda _: self.show_info_snackbar("Envoi WhatsApp lancé avec succès. Veuillez vérifier votre navigateur."),
+            on_error=on_error,
+        )
                
     def exit_file_manager(self, *args):
         self.file_manager.close()
     
     def filtrer(self, year, month, day):
-        visiteurs = self.visitor_manager.lister_visiteurs()
-        result = []
-        for v in visiteurs:
-            try:
-                d = datetime.strptime(v.date, "%Y-%m-%d")
-            except Exception as e:
-                logger.error(f"L'erreur suivante vient de se produire {e}")
-            if year and str(d.year) != year:
-                continue
-            if month and str(d.month).zfill(2) != month.zfill(2):
-                continue
-            if day and str(d.day).zfill(2) != day.zfill(2):
-                continue
-            result.append(v)
-        
-        if not result:
-            box = self.root.get_screen("screen A").ids.box
-            box.clear_widgets()
-            box.add_widget(MDLabel(
-                text=f"Aucun visiteur ne correspond aux critères de recherche, le {day} / {month} / {year}. Veuillez réessayer.",
-                halign="center",
-                size_hint_y=None,
-                height=dp(70)
-            ))
+        try:
+            filtre = {
+                **self._filtre_visiteurs,
+                "annee": int(year) if year else None,
+                "mois": int(month) if month else None,
+                "jour": int(day) if day else None,
+            }
+        except ValueError as e:
+            self.show_error_dialog("La date choisie pour le filtre est invalide.")
+            logger.error(f"L'erreur suivante vient de se produire {e}")
             return
+        
+        self._appliquer_filtre(
+            filtre,
+            f"Aucun visiteur ne correspond aux critères de recherche, le {day} / {month} / {year}. Veuillez réessayer."
+        )
+    
+    def rechercher(self, texte):
+        """Recherche par téléphone, lieu de naissance, motif ou observation."""
+        texte = texte.strip()
+        filtre = {**self._filtre_visiteurs, "recherche": texte or None}
+        self._appliquer_filtre(
+            filtre,
+            f"Aucun visiteur ne correspond à la recherche « {texte} ». Veuillez réessayer."
+        )
+    
+    def _appliquer_filtre(self, filtre, message_vide):
+        def on_success(page):
+            visiteurs, curseur = page
+            self._filtre_visiteurs = filtre
+            if not visiteurs:
+                screen = self.root.get_screen("screen A")
+                self._curseur_visiteurs = None
+                self._cartes_visiteurs = {}
+                screen.ids.box.data = []
+                screen.ids.empty_label.text = message_vide
+                return
             
-        self.afficher_heros_visiteurs(result)
+            self.afficher_heros_visiteurs(visiteurs, curseur)
+        
+        def on_error(e):
+            logger.error(f"L'erreur suivante vient de se produire {e}")
+            if isinstance(e, ValueError):
+                self.show_error_dialog("La date choisie pour le filtre est invalide.")
+            else:
+                self.show_error_dialog("Erreur lors du chargement des visiteurs.")
+        
+        self._charger_visiteurs(filtre, on_success, on_error=on_error)
     
     def get_field(self, field_name):
         """Retourne le champ de date correspondant au nom."""
@@ -734,44 +939,31 @@ class Gestion(MDApp):
             self.show_error_dialog("Tous les champs sont obligatoires.")
             return
         
-        try:
+        def authentifier():
             user, error = self.user_manager.authenticate_user(email, password)
-        except Exception as e:
-            self.show_error_dialog("Erreur lors de l'authentification.")
-            logger.error(f"L'erreur suivante vient de se produire {e}")
-            return
+            if not error:
+                # Détache l'utilisateur de la session pour éviter les problèmes plus tard
+                make_transient(user)
+            return user, error
         
-        if error:
-            self.show_error_dialog(error)
-            return
-        
-        # Détache l'utilisateur de la session pour éviter les problèmes plus tard
-        make_transient(user)
+        def on_success(resultat):
+            user, error = resultat
+            if error:
+                self.show_error_dialog(error)
+                return
+            
+            self.user = user
+            self.root.current = "screen A"
+            self.show_info_snackbar("Connexion réussie!", str(self.user.id))  
+            self._demarrer_notifications()
         
-        self.user = user
-        self.root.current = "screen A"
-        self.show_info_snackbar("Connexion réussie!", str(self.user.id))  
+        self.en_arriere_plan(authentifier, on_success=on_success, erreur="Erreur lors de l'authentification.")
     
-    def notify_new_items(self, manager, item_type: str):
-        """Poll les nouveaux items et envoie des notifications."""
-        try:
-            # Utilise la session du manager pour les requêtes
-            with manager.Session() as session:
-                items = manager.get_shares_for_user(self.user.id)
-                for item in items:
-                    # Recharge l'item dans la session active
-                    item = session.merge(item)
-                    shared_by_user = self.user_manager.get_user_by_id(item.shared_by_user_id)
-                    self.notify_new_share(shared_by_user, item_type)
-                    manager.edit_share_status(item)
-        except Exception as e:
-            logger.error(f"L'erreur suivante vient de se produire {e}")
-      
-    def notify_new_share(self, shared_by_user: User, share_type: str):
+    def notify_new_share(self, share: ShareInboxItem):
         try:
             notification.notify(
-                title=f"Nouveau {share_type} reçu",
-                message=f"Vous avez reçu un {share_type} de la part de {shared_by_user.prenom} {shared_by_user.nom}.",
+                title=f"Nouveau {share.type} reçu",
+                message=f"Vous avez reçu un {share.type} de la part de {share.expediteur}.",
                 app_name="GestionVisiteurs",
                 app_icon=resource_path("pictures/icone.ico"),
                 timeout=5
@@ -789,60 +981,135 @@ class Gestion(MDApp):
         logger.info(f"Répertoire de travail défini sur : {os.getcwd()}")
         
         self.afficher_heros_visiteurs()
-        Clock.schedule_interval(self._poll_for_new_items, self._notify_poll_interval)
+    
+    def on_stop(self):
+        self._arreter_notifications()
+        self.taches.shutdown()
+        self.images.shutdown()
+        self.image_loader.shutdown()
+    
+    def _demarrer_notifications(self):
+        """
+        Notifications des partages reçus : push (LISTEN/NOTIFY) sur PostgreSQL,
+        sinon vérification toutes les `_notify_poll_interval` secondes.
+        """
+        self._arreter_notifications()
+        self._reperes_partages = {
+            type_partage: self.watermarks.get(self._cle_repere(type_partage, self.user.id), 0)
+            for type_partage in self._reperes_partages
+        }
+        self.compteurs_partages = {}
+        engine = get_database().engine
+        if push_disponible(engine):
+            self._ecouteur_partages = ShareListener(engine, self.user.id, self._sur_notification_partage)
+            self._ecouteur_partages.start()
+        else:
+            self._evenement_poll = Clock.schedule_interval(self._poll_for_new_items, self._notify_poll_interval)
+    
+    def _arreter_notifications(self):
+        if self._ecouteur_partages:
+            self._ecouteur_partages.stop()
+            self._ecouteur_partages = None
+        if self._evenement_poll:
+            self._evenement_poll.cancel()
+            self._evenement_poll = None
+    
+    def _sur_notification_partage(self, evenement):
+        """Appelé par le thread d'écoute : la vérification se fait dans la boucle Kivy."""
+        types = ("visiteur", "document")
+        if evenement and evenement.get("type") in types:
+            types = (evenement["type"],)
+        Clock.schedule_once(lambda dt: self._verifier_nouveaux_partages(types))
+    
+    @staticmethod
+    def _cle_repere(type_partage, user_id):
+        return f"partages_{type_partage}_{user_id}"
     
     def _poll_for_new_items(self, dt):
-        """Poll périodique : récupère les partages/documents actifs et notifie."""
+        """Poll périodique (repli sans notifications push)."""
+        self._verifier_nouveaux_partages()
+    
+    def _verifier_nouveaux_partages(self, types=("visiteur", "document")):
+        """
+        Récupère en arrière-plan les partages actifs plus récents que le dernier
+        repère et notifie : le coût dépend du nombre de nouveaux partages, pas de
+        la taille de la boîte de réception.
+        """
         if not self.user:
             return
+        user_id = self.user.id
+        reperes = dict(self._reperes_partages)
+
+        def recuperer():
+            partages = []
+            if "visiteur" in types:
+                partages += self.visitor_manager.get_inbox_for_user(
+                    user_id, statuts=("active",), apres_id=reperes["visiteur"]
+                )
+            if "document" in types:
+                partages += self.document_manager.get_inbox_for_user(
+                    user_id, statuts=("active",), apres_id=reperes["document"]
+                )
+            return partages
+
+        self.en_arriere_plan(recuperer, on_success=self._notifier_nouveaux_partages, erreur=None, silent=True)
+        self.rafraichir_badges()
 
-        # visitors
-        with contextlib.suppress(Exception):
-            shares = self.visitor_manager.get_active_shares_for_user(self.user.id)
-            for s in shares:
-                if s.id not in self._notified_share_ids:
-                    shared_by_user = self.user_manager.get_user_by_id(s.shared_by_user_id)
-                    self.notify_new_share(shared_by_user, "visiteur")
-                    # marque comme traité (ton manager semble proposer cette méthode)
-                    with contextlib.suppress(Exception):
-                        self.visitor_manager.edit_share_status(s)
-                    self._notified_share_ids.add(s.id)
-        # documents
-        with contextlib.suppress(Exception):
-            docs = self.document_manager.get_active_shares_for_user(self.user.id)
-            for d in docs:
-                if d.id not in self._notified_doc_ids:
-                    shared_by_user = self.user_manager.get_user_by_id(d.shared_by_user_id)
-                    self.notify_new_share(shared_by_user, "document")
-                    with contextlib.suppress(Exception):
-                        self.document_manager.edit_share_status(d)
-                    self._notified_doc_ids.add(d.id)
+    def _notifier_nouveaux_partages(self, partages):
+        # Les repères ne sont avancés que dans la boucle Kivy : deux vérifications
+        # concurrentes ne notifient pas deux fois le même partage
+        nouveaux = [p for p in partages if p.id > self._reperes_partages[p.type]]
+        if not nouveaux:
+            return
+        for p in nouveaux:
+            self._reperes_partages[p.type] = max(self._reperes_partages[p.type], p.id)
+        self.en_arriere_plan(
+            self._signaler_partages, nouveaux, dict(self._reperes_partages), self.user.id,
+            # De nouveaux partages sont arrivés : les compteurs changent
+            on_success=lambda _: self.rafraichir_badges(),
+            erreur=None, silent=True,
+        )
+
+    def _signaler_partages(self, partages, reperes, user_id):
+        """
+        Notifications système et sauvegarde des repères (hors thread Kivy).
+        Le statut des partages n'est pas modifié : ils restent "active", donc
+        visibles, acceptables et refusables ; les repères suffisent à ne pas
+        les notifier deux fois.
+        """
+        for p in partages:
+            self.notify_new_share(p)
+        for type_partage, repere in reperes.items():
+            self.watermarks.set(self._cle_repere(type_partage, user_id), repere)
 
     def open_document(self, document):
-        blob, filename = self.document_manager.get_document_blob(document.id)
-        # créer un fichier temporaire
-        suffix = "." + filename.split(".")[-1]
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-        tmp.write(blob)
-        tmp.close()
+        self.en_arriere_plan(
+            self._telecharger_document, document.id,
+            erreur="Erreur lors de l'ouverture du document.",
+        )
+
+    def _telecharger_document(self, document_id):
+        """
+        Ouvre un document depuis le cache local, ou le télécharge d'abord
+        morceau par morceau dans le cache (hors thread Kivy).
+        """
+        chemin = self.documents_cache.get(document_id)
+        if chemin is None:
+            infos = self.document_manager.infos_document(document_id)
+            if infos is None:
+                raise ValueError(f"Document {document_id} introuvable")
+            chemin = self.documents_cache.put(
+                document_id, infos.blob_hash, infos.file_name,
+                lambda fichier: self.document_manager.telecharger_document(document_id, fichier),
+            )
         # l’ouvrir dans le navigateur/application par défaut
-        webbrowser.open(tmp.name)
-        
-        # supprimer le fichier temporaire après un délai
-        Clock.schedule_once(lambda dt: os.remove(tmp.name), 300)
+        webbrowser.open(chemin)
+        return chemin
 
     def open_document_dialog(self):
         """_summary_: ouvre un dialogue contenant les documents partagés avec l'utilisateur.
         """
-        user_id = self.user.id
-        documents = self.document_manager.get_shares_for_user(user_id)
-        
-        if not documents:
-            self.show_info_snackbar("Aucun document partagé avec vous pour le moment.")
-            return
-        
         def format_document(doc):
-            shared_by_user = self.user_manager.get_user_by_id(doc.shared_by_user_id)
             ts = doc.shared_at.strftime("%d/%m/%Y %H:%M")
             item =  MDListItem(
                 MDListItemLeadingIcon(
@@ -852,7 +1119,7 @@ class Gestion(MDApp):
                     text=f"Document ID: {doc.id}",
                 ),
                 MDListItemSupportingText(
-                    text=f"Partagé par {shared_by_user.nom} {shared_by_user.prenom} le {ts}",
+                    text=f"Partagé par {doc.expediteur_nom} {doc.expediteur_prenom} le {ts}",
                 ),
                 MDListItemTertiaryText(
                     text=f"Type: {doc.document_type.upper()}",
@@ -868,10 +1135,21 @@ class Gestion(MDApp):
             )
             return item
         
-        self.open_share_dialog(
-            title="Documents partagés avec vous",
-            items=documents,
-            formatter=format_document
+        def on_success(documents):
+            if not documents:
+                self.show_info_snackbar("Aucun document partagé avec vous pour le moment.")
+                return
+            
+            self.open_share_dialog(
+                title="Documents partagés avec vous",
+                items=documents,
+                formatter=format_document
+            )
+        
+        self.en_arriere_plan(
+            self.document_manager.get_inbox_for_user, self.user.id,
+            on_success=on_success,
+            erreur="Erreur lors du chargement des documents partagés.",
         )
     
     def open_share_dialog(self, title: str, items: list, formatter: callable):
@@ -1016,29 +1294,69 @@ class Gestion(MDApp):
             on_release=lambda x: self.envoyer_image_visiteur_whatsapp()
         )
         
-        content = MDGridLayout(cols=2, spacing=10, size_hint_y=None, adaptive_height=True)
-        content.add_widget(email_button)
-        content.add_widget(whatsapp_button)
-        for user in self.user_manager.list_users():
-            if user.id != self.user.id:
-                button = self.creer_bouton(
-                    f"Partager avec {user.prenom} {user.nom}",
-                    style="outlined",
-                    icone="account",
-                    on_release=self.share_visitor(self.visiteur, self.user.id, user.id)
-                )
-                content.add_widget(button)
-        
-        actions = [
-            Widget(),
-            self.creer_bouton(
-            "Annuler",
-            style="text",
-            on_release=lambda x: self.dialog.dismiss(),
-            ),
-        ]
+        def afficher(utilisateurs):
+            content = MDBoxLayout(orientation="vertical", spacing=10, adaptive_height=True)
+            boutons = MDGridLayout(cols=2, spacing=10, size_hint_y=None, adaptive_height=True)
+            boutons.add_widget(email_button)
+            boutons.add_widget(whatsapp_button)
+            content.add_widget(boutons)
+
+            # Sélection multiple des collègues : un seul partage groupé
+            cases = {}
+            liste = MDList(size_hint_y=None, adaptive_height=True)
+            for user in utilisateurs:
+                if user.id != self.user.id:
+                    cases[user.id] = MDListItemTrailingCheckbox()
+                    liste.add_widget(MDListItem(
+                        MDListItemLeadingIcon(icon="account"),
+                        MDListItemHeadlineText(text=f"{user.prenom} {user.nom}"),
+                        MDListItemSupportingText(text=user.structure or ""),
+                        cases[user.id],
+                    ))
+            liste.bind(minimum_height=liste.setter('height'))
+            scroll = ScrollView(
+                size_hint_y=None,
+                height=dp(300),
+                bar_width=dp(4),
+                scroll_type=['bars', 'content'],
+                do_scroll_x=False
+            )
+            scroll.add_widget(liste)
+            content.add_widget(scroll)
+
+            def partager_selection(instance):
+                destinataires = [user_id for user_id, case in cases.items() if case.active]
+                if not destinataires:
+                    self.show_error_dialog("Aucun collègue sélectionné.")
+                    return
+                self.share_visitor(self.visiteur, self.user.id, destinataires)
+
+            actions = [
+                Widget(),
+                self.creer_bouton(
+                "Annuler",
+                style="text",
+                on_release=lambda x: self.dialog.dismiss(),
+                ),
+                self.creer_bouton(
+                "Toute ma structure",
+                style="text",
+                on_release=lambda x: self.share_visitor(self.visiteur, self.user.id, structure=self.user.structure),
+                ),
+                self.creer_bouton(
+                "Partager",
+                style="filled",
+                on_release=partager_selection,
+                ),
+            ]
+            
+            self.dialog = self.creer_dialogue("Partager", content, actions)
         
-        self.dialog = self.creer_dialogue("Partager", content, actions)
+        self.en_arriere_plan(
+            self.user_manager.list_users,
+            on_success=afficher,
+            erreur="Erreur lors du chargement des utilisateurs.",
+        )
             
     def remplir_champs(self):
         screen = self.root.get_screen("screen B")
@@ -1047,16 +1365,16 @@ class Gestion(MDApp):
         screen.ids.phone_number.text = self.visiteur.phone_number
         screen.ids.place_of_birth.text = self.visiteur.place_of_birth or ""
         screen.ids.motif.text = self.visiteur.motif
-        screen.ids.date.text = self.visiteur.date
-        screen.ids.arrival_time.text = self.visiteur.arrival_time
+        screen.ids.date.text = self.visiteur.date.isoformat()
+        screen.ids.arrival_time.text = self.visiteur.arrival_time.strftime("%H:%M")
         screen.ids.exit_time.text = self.visiteur.exit_time or ""
         screen.ids.observation.text = self.visiteur.observation or ""
 
-        screen.ids.image.source = self.visiteur.image_path
+        self.afficher_image_detail(self.visiteur.image_path)
         self.masquer_bouttons(screen)
 
     def _remplir_champs_(self, screen):
-        screen.ids.image.source = ""
+        self.afficher_image_detail("")
         screen.ids.phone_number.text = ""
         screen.ids.place_of_birth.text = ""
         screen.ids.motif.text = ""
@@ -1069,6 +1387,21 @@ class Gestion(MDApp):
         screen.ids.btn_share.disabled = True
         return self.masquer_bouttons(screen)
 
+    def afficher_image_detail(self, path):
+        """Charge l'image de l'écran de détail en arrière-plan ("" pour la vider)."""
+        image = self.root.get_screen("screen B").ids.image
+        if self._requete_image_detail:
+            self._requete_image_detail.cancel()
+            self._requete_image_detail = None
+        
+        image.texture = None
+        if path:
+            self._requete_image_detail = self.image_loader.load(
+                path,
+                lambda texture: setattr(image, "texture", texture),
+                max_size=DETAIL_IMAGE_SIZE,
+            )
+
     def masquer_bouttons(self, screen):
         screen.ids.btn_save.disabled = True
         screen.ids.btn_cancel.disabled = True
@@ -1080,7 +1413,9 @@ class Gestion(MDApp):
         screen.ids.year_filter.text = ""
         screen.ids.month_filter.text = ""
         screen.ids.day_filter.text = ""
+        screen.ids.search_field.text = ""
         # Affiche tous les visiteurs
+        self._filtre_visiteurs = {}
         self.afficher_heros_visiteurs()
     
     def reset_password(self):
@@ -1099,14 +1434,13 @@ class Gestion(MDApp):
             self.show_error_dialog("La longueur minimale du mot de passe est de 8 caractères.")
             return
 
-        try:
-            self.reset_fields_modify_pw(new_password_first, screen)
-        except ValueError as e:
-            self.show_error_dialog("Une erreur s'est produite lors changement du mot de passe, veillez réessayer.")
-            logger.error(f"L'erreur suivante vient de se produire {e}")
+        self.en_arriere_plan(
+            self.user_manager.reset_password_with_token, self.token, new_password_first,
+            on_success=lambda _: self.reset_fields_modify_pw(screen),
+            erreur="Une erreur s'est produite lors changement du mot de passe, veillez réessayer.",
+        )
 
-    def reset_fields_modify_pw(self, new_password_first, screen):
-        self.user_manager.reset_password_with_token(self.token, new_password_first)
+    def reset_fields_modify_pw(self, screen):
         self.show_info_snackbar("Mot de passe rénitialisé avec succès!")
 
         screen.ids.new_password_first.text = ""
@@ -1120,28 +1454,46 @@ class Gestion(MDApp):
         os.execl(python, python, *sys.argv)
             
     def signup(self, last_name, first_name, email, password_first, role):
-        try:
+        def inscrire():
             self.user_manager.add_user(last_name, first_name, email, password_first, "GN-Rabat", role)
-            
-            self.user = self.user_manager.authenticate_user(email, password_first)
+            user, error = self.user_manager.authenticate_user(email, password_first)
+            if not error:
+                # Détache l'utilisateur de la session, comme à la connexion
+                make_transient(user)
+            return user, error
+
+        def on_success(resultat):
+            user, error = resultat
+            if user is None:
+                self.show_error_dialog(error)
+                return
+
+            self.user = user
             self.root.current = "screen A"
-            
-            self.show_info_snackbar("Compte crée avec succès.", str(self.user))
-        except ValueError as e:
-            self.show_error_dialog("Une erreur s'est produite lors de la création du compte, veuillez réessayer.")
-            logger.error(f"L'erreur suivante vient de se produire {e}")
+            self.show_info_snackbar("Compte crée avec succès.", str(self.user.id))
+            self._demarrer_notifications()
+
+        self.en_arriere_plan(
+            inscrire,
+            on_success=on_success,
+            erreur="Une erreur s'est produite lors de la création du compte, veuillez réessayer.",
+        )
             
     def send_reset_code(self):
         email = self.root.get_screen("reset").ids.reset_email.text
         
-        try:
-            self.token = self.user_manager.generate_reset_token(email)
+        def on_success(token):
+            self.token = token
             self.root.current = "code_input"
-        except ValueError as e:
+        
+        def on_error(e):
             self.show_error_dialog("Une erreur s'est produite lors de l'envoie du code, veuillez réessayer.")
             logger.error(f"L'erreur suivante vient de se produire {e}")
             self.root.get_screen("reset").ids.reset_email.text = ""
         
+        # Génération du code et envoi du mail (SMTP) hors du thread Kivy
+        self.en_arriere_plan(self.user_manager.generate_reset_token, email, on_success=on_success, on_error=on_error)
+        
     def set_item(self, item, field_name):
         """Met à jour le champ de date avec l'item sélectionné."""
         self.get_field(field_name).text = item
@@ -1176,32 +1528,45 @@ class Gestion(MDApp):
             self.set_img_path(selection)
             
     def set_img_path(self, selection):
+        """
+        Redresse, réduit et réencode l'image choisie, ou fusionne les pages
+        choisies (recto/verso, passeport et visas...), avant de l'afficher dans
+        l'écran de détail ; les originaux ne sont pas référencés.
+        Une nouvelle sélection annule le traitement en cours.
+        """
         self.file_manager_mode = None
-        self.activer_boutons_modification()
-
-        path1 = Path(selection[0])
-        img1 = Image.open(path1)
-
-        if len(selection) > 1:
-            self.concatene_save_image(selection, img1, path1)
-        else:
-            self.selected_image_path = str(path1)
-
-        self.root.get_screen("screen B").ids.image.source = self.selected_image_path
-
-    def concatene_save_image(self, selection, img1, path1):
-        path2 = Path(selection[1])
-        img2 = Image.open(path2)
+        self.annuler_traitement_image()
+        progression = self.root.get_screen("screen B").ids.progression_image
+
+        def on_progress(faites, total):
+            progression.value = 100 * faites / total
+
+        def on_done(chemin):
+            self._tache_image = None
+            progression.opacity = 0
+            self.selected_image_path = chemin
+            self.afficher_image_detail(chemin)
+            self.activer_boutons_modification()
+
+        def on_error(e):
+            self._tache_image = None
+            progression.opacity = 0
+            self.activer_boutons_modification()
+            logger.error(f"L'erreur suivante vient de se produire {e}")
+            self.show_error_dialog("Impossible de lire l'image sélectionnée.")
 
-        # Fusion verticale (empilement)
-        new_img = Image.new("RGB", (max(img1.width, img2.width), img1.height + img2.height))
-        new_img.paste(img1, (0, 0))
-        new_img.paste(img2, (0, img1.height))
+        progression.value = 0
+        progression.opacity = 1
+        self._tache_image = self.images.merge(selection, on_done, on_progress=on_progress, on_error=on_error)
+        # Enregistrer reste désactivé jusqu'à on_done / on_error
+        self.activer_boutons_modification()
 
-        image_dir = os.path.join(os.path.expanduser("~"), "Documents", "GestionVisiteur", "ID")
-        os.makedirs(image_dir, exist_ok=True)
-        self.selected_image_path = os.path.join(image_dir, f"fusion_de_{path1.stem}_et_{path2.stem}.jpg")
-        new_img.save(self.selected_image_path)
+    def annuler_traitement_image(self):
+        """Annule la fusion d'images en cours, s'il y en a une."""
+        if self._tache_image:
+            self._tache_image.cancel()
+            self._tache_image = None
+            self.root.get_screen("screen B").ids.progression_image.opacity = 0
     
     def send_document(self):
         if not self.selected_document_path:
@@ -1211,14 +1576,14 @@ class Gestion(MDApp):
         caption = "Veuillez trouver le document ci-joint."
         receiver = self.demander_numero()
 
-        try:
-            self.send_document_whatsapp(receiver, caption)
-        except Exception as e:
+        def on_error(e):
             logger.error(f"Une erreur s'est produite {e}")
             self.show_error_dialog("Désolé il faut être connecté à internet pour pouvoir faire ce partage. \nVérifiez l'état de votre connexion")
-            return
 
-        self.selected_document_path = ""
+        def on_success(_):
+            self.selected_document_path = ""
+
+        self.en_arriere_plan(self.send_document_whatsapp, receiver, caption, on_success=on_success, on_error=on_error)
 
     def send_document_whatsapp(self, receiver, caption):
         from selenium import webdriver
@@ -1275,24 +1640,37 @@ class Gestion(MDApp):
         # Ajouter une légende si besoin
         time.sleep(1)
         
-    def share_document(self, from_user_id, to_user_id, document_path):
+    def share_document(self, from_user_id, to_user_ids, document_path):
+        """Partage un document avec un ou plusieurs collègues, en une seule transaction."""
         document_type = os.path.splitext(document_path)[1][1:]
-        doc = self.document_manager.share_document(from_user_id, to_user_id, document_path, document_type)
-        self.show_info_snackbar("Document partagé avec succès!", str(doc.id))
         
-        self.dialog.dismiss()
+        def on_success(share_ids):
+            self.show_info_snackbar(f"Document partagé avec {len(share_ids)} collègue(s)!", ", ".join(map(str, share_ids)))
+            self.dialog.dismiss()
+        
+        self.en_arriere_plan(
+            self.document_manager.share_document_many, from_user_id, to_user_ids, document_path, document_type,
+            on_success=on_success,
+            erreur="Une erreur s'est produite lors du partage du document, veuillez réessayer.",
+        )
     
-    def share_visitor(self, visiteur, from_user_id, to_user_id):
-        def _share(instance):
-            try:
-                share_id = self.visitor_manager.share_visitor(visiteur, from_user_id, to_user_id)
-                self.show_info_snackbar("Visiteur partagé avec succès!", str(share_id))
-                
-                self.dialog.dismiss()
-            except ValueError as e:
-                self.show_error_dialog("Une erreur s'est produite lors du partage du visiteur, veuillez réessayer.")
-                logger.error(f"L'erreur suivante vient de se produire {e}")
-        return _share
+    def share_visitor(self, visiteur, from_user_id, to_user_ids=(), structure=None):
+        """
+        Partage un visiteur avec les collègues sélectionnés et/ou toute une
+        structure, en une seule transaction.
+        """
+        def on_success(share_ids):
+            if not share_ids:
+                self.show_error_dialog("Aucun collègue à qui partager ce visiteur.")
+                return
+            self.show_info_snackbar(f"Visiteur partagé avec {len(share_ids)} collègue(s)!", ", ".join(map(str, share_ids)))
+            self.dialog.dismiss()
+        
+        self.en_arriere_plan(
+            self.visitor_manager.share_visitor_many, visiteur, from_user_id, to_user_ids, structure=structure,
+            on_success=on_success,
+            erreur="Une erreur s'est produite lors du partage du visiteur, veuillez réessayer.",
+        )
     
     def show_error_dialog(self, message):
         error_dialog = MDDialog(
@@ -1324,20 +1702,59 @@ class Gestion(MDApp):
         
         self.root.current = "screen B"
         self.root.transition = SlideTransition(direction="left")
+
+    def show_visitor_details_by_id(self, visitor_id=None):
+        """Ouvre le détail depuis une carte de la grille (None = nouvelle fiche)."""
+        # Un clic plus récent remplace le précédent
+        if self._tache_detail:
+            self._tache_detail.cancel()
+            self._tache_detail = None
+        if visitor_id is None:
+            return self.show_visitor_details()
+        
+        def on_success(visiteur):
+            if visiteur is None:
+                self.show_error_dialog("Visiteur non trouvé.")
+                return
+            self.show_visitor_details(visiteur)
+        
+        self._tache_detail = self.en_arriere_plan(
+            self.visitor_manager.chercher_visiteur, visitor_id,
+            on_success=on_success,
+            erreur="Erreur lors du chargement du visiteur.",
+        )
     
     def toggle_password_visibility(self, btn, text_field):
         text_field.password = btn.icon != "eye"
         btn.icon = "eye-off" if btn.icon == "eye" else "eye"
         
+    def rafraichir_badges(self):
+        """Recompte les partages reçus (une requête COUNT) et met à jour les badges."""
+        if not self.user:
+            return
+        self.en_arriere_plan(
+            self.visitor_manager.compter_partages_recus, self.user.id,
+            on_success=self._afficher_badges, erreur=None, silent=True,
+        )
+    
+    def _afficher_badges(self, compteurs):
+        if compteurs == self.compteurs_partages:
+            return
+        self.compteurs_partages = compteurs
+        ids = self.root.get_screen("screen A").ids
+        for badge, type_partage in (("ntf_badge", "visiteur"), ("doc_badge", "document")):
+            # Les badges peuvent être retirés de l'écran principal
+            if badge in ids:
+                nombre = compteurs.get(type_partage, 0)
+                ids[badge].text = str(nombre) if nombre else ""
+    
     def update_notification_badge(self):
         """Récupère et affiche le nombre de partages reçus."""
-        shares = self.visitor_manager.get_active_shares_for_user(self.user.id)
-        self.root.get_screen("screen A").ids.ntf_badge.text = str(len(shares)) if shares else ""
+        self.rafraichir_badges()
     
     def update_document_badge(self):
         """Récupère et affiche le nombre de documents partagés reçus."""
-        documents = self.document_manager.get_shares_for_user(self.user.id)
-        self.root.get_screen("screen A").ids.doc_badge.text = str(len(documents)) if documents else ""
+        self.rafraichir_badges()
         
     def valider_champs(self, phone_number, place_of_birth, motif):
         if not all([phone_number, place_of_birth, motif]):
@@ -1,2 +1,7 @@
 from .helpers import resource_path
-from .logger_config import setup_logger
\ No newline at end of file
+from .logger_config import setup_logger
+from .disk_cache import DiskCache
+from .document_cache import DocumentCache
+from .image_ingestion import ImageIngestion
+from .thumbnails import ThumbnailCache
+from .watermarks import WatermarkStore
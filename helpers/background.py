@@ -0,0 +1,76 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+from kivy.event import EventDispatcher
+from kivy.properties import NumericProperty
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTask:
+    """Opération annulable retournée par BackgroundRunner.submit()."""
+
+    def __init__(self, on_success, on_error, silent: bool):
+        self.on_success = on_success
+        self.on_error = on_error
+        self.silent = silent
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        """Le résultat ne sera pas livré ; si l'appel n'a pas commencé, il n'aura pas lieu."""
+        self.cancelled = True
+
+
+class BackgroundRunner(EventDispatcher):
+    """
+    Exécute les appels bloquants (base de données, SMTP, réseau) dans un pool
+    de threads borné. Le résultat, ou l'exception, est remis au thread Kivy
+    via Clock : `on_success(resultat)` / `on_error(exception)`.
+    `pending` compte les tâches non silencieuses en cours, pour afficher un
+    indicateur de chargement.
+    """
+    pending = NumericProperty(0)
+
+    def __init__(self, max_workers: int = 4, **kwargs):
+        super().__init__(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background")
+
+    def submit(self, fonction, *args, on_success=None, on_error=None, silent: bool = False, **kwargs) -> BackgroundTask:
+        """
+        Lance `fonction(*args, **kwargs)` en arrière-plan.
+        :param silent: n'affecte pas `pending` (ex : vérifications périodiques)
+        """
+        task = BackgroundTask(on_success, on_error, silent)
+        if not silent:
+            self.pending += 1
+        self._executor.submit(self._run, task, fonction, args, kwargs)
+        return task
+
+    def _run(self, task: BackgroundTask, fonction, args, kwargs):
+        resultat, erreur = None, None
+        if not task.cancelled:
+            try:
+                resultat = fonction(*args, **kwargs)
+            except Exception as e:
+                erreur = e
+        Clock.schedule_once(lambda dt: self._deliver(task, resultat, erreur))
+
+    def _deliver(self, task: BackgroundTask, resultat, erreur):
+        task.done = True
+        if not task.silent:
+            self.pending -= 1
+        if task.cancelled:
+            return
+
+        if erreur is None:
+            if task.on_success:
+                task.on_success(resultat)
+        elif task.on_error:
+            task.on_error(erreur)
+        else:
+            logger.error(f"L'erreur suivante vient de se produire {erreur}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
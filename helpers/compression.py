@@ -0,0 +1,126 @@
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codecs des contenus stockés, enregistrés avec chaque blob (colonne blobs.codec)
+CODEC_BRUT = "raw"
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+# Codec des nouveaux contenus : zstd si le paquet 'zstandard' est installé, sinon zlib.
+# GESTION_COMPRESSION=raw désactive la compression.
+CODEC_DEFAUT = os.environ.get("GESTION_COMPRESSION", CODEC_ZSTD if zstandard else CODEC_ZLIB)
+NIVEAU_ZLIB = 6
+NIVEAU_ZSTD = 3
+# La compression n'est retenue que si l'échantillon tombe sous cette fraction de sa taille
+RATIO_MAX = 0.9
+
+# Signatures des formats déjà compressés : inutile d'essayer
+SIGNATURES_COMPRESSEES = (
+    b"\xff\xd8\xff",        # JPEG
+    b"PK\x03\x04",          # ZIP, docx, xlsx, odt...
+    b"\x1f\x8b",            # gzip
+    b"(\xb5/\xfd",          # zstd
+    b"7z\xbc\xaf\x27\x1c",  # 7z
+    b"Rar!\x1a\x07",        # RAR
+    b"GIF8",                # GIF
+)
+
+
+def deja_compresse(echantillon: bytes) -> bool:
+    """Reconnaît les formats compressés (JPEG, ZIP/Office, WebP, MP4...) à leur signature."""
+    if echantillon.startswith(SIGNATURES_COMPRESSEES):
+        return True
+    # WebP : conteneur RIFF ; MP4/MOV/HEIC : boîte ftyp
+    return (echantillon[:4] == b"RIFF" and echantillon[8:12] == b"WEBP") or echantillon[4:8] == b"ftyp"
+
+
+def choisir_codec(echantillon: bytes, codec: str = CODEC_DEFAUT) -> str:
+    """
+    Codec à utiliser pour un contenu, d'après son premier morceau : CODEC_BRUT
+    pour les formats déjà compressés ou si l'essai de compression ne gagne pas assez.
+    """
+    if codec == CODEC_BRUT or not echantillon or deja_compresse(echantillon):
+        return CODEC_BRUT
+    if len(compresser(echantillon, codec)) > len(echantillon) * RATIO_MAX:
+        return CODEC_BRUT
+    return codec
+
+
+def compresser(donnees: bytes, codec: str) -> bytes:
+    """Compresse un morceau ; chaque morceau se décompresse indépendamment des autres."""
+    if codec == CODEC_BRUT:
+        return donnees
+    if codec == CODEC_ZLIB:
+        return zlib.compress(donnees, NIVEAU_ZLIB)
+    if codec == CODEC_ZSTD:
+        return _zstandard().ZstdCompressor(level=NIVEAU_ZSTD).compress(donnees)
+    raise ValueError(f"Codec inconnu : {codec}")
+
+
+def decompresser(donnees: bytes, codec: str) -> bytes:
+    if codec == CODEC_BRUT:
+        return donnees
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(donnees)
+    if codec == CODEC_ZSTD:
+        return _zstandard().ZstdDecompressor().decompress(donnees)
+    raise ValueError(f"Codec inconnu : {codec}")
+
+
+def _zstandard():
+    if zstandard is None:
+        raise ValueError("La compression zstd nécessite le paquet 'zstandard'.")
+    return zstandard
+
+
+if __name__ == "__main__":
+    # Octets stockés et temps de lecture par codec sur un corpus de fichiers :
+    #   python -m helpers.compression <dossier> [taille des morceaux en Ko, 1024 par défaut]
+    import sys
+    import time
+
+    dossier = sys.argv[1]
+    taille_morceau = (int(sys.argv[2]) if len(sys.argv) > 2 else 1024) * 1024
+    codecs = [CODEC_ZLIB] + ([CODEC_ZSTD] if zstandard else [])
+
+    totaux = {codec: [0, 0.0, 0.0] for codec in [CODEC_BRUT, "auto"] + codecs}
+    print(f"{'fichier':<32}{'taille':>12}" + "".join(f"{codec:>12}" for codec in codecs) + f"{'retenu':>10}")
+    for nom in sorted(os.listdir(dossier)):
+        chemin = os.path.join(dossier, nom)
+        if not os.path.isfile(chemin):
+            continue
+        with open(chemin, "rb") as f:
+            morceaux = list(iter(lambda: f.read(taille_morceau), b""))
+        taille = sum(map(len, morceaux))
+        retenu = choisir_codec(morceaux[0] if morceaux else b"")
+
+        tailles = {}
+        for codec in [CODEC_BRUT] + codecs:
+            debut = time.perf_counter()
+            stockes = [compresser(morceau, codec) for morceau in morceaux]
+            ecriture = time.perf_counter() - debut
+            debut = time.perf_counter()
+            for morceau in stockes:
+                decompresser(morceau, codec)
+            lecture = time.perf_counter() - debut
+
+            tailles[codec] = sum(map(len, stockes))
+            for cle in {codec, "auto"} if codec == retenu else {codec}:
+                totaux[cle][0] += tailles[codec]
+                totaux[cle][1] += ecriture
+                totaux[cle][2] += lecture
+
+        print(f"{nom[:31]:<32}{taille:>12}" + "".join(f"{tailles[codec]:>12}" for codec in codecs) + f"{retenu:>10}")
+
+    brut = totaux[CODEC_BRUT][0] or 1
+    print()
+    for codec, (octets, ecriture, lecture) in totaux.items():
+        print(
+            f"{codec:<6} : {octets / 2**20:8.1f} Mo stockés ({octets / brut:6.1%}), "
+            f"compression {ecriture * 1000:8.1f} ms, lecture {lecture * 1000:8.1f} ms"
+        )
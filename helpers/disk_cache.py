@@ -0,0 +1,111 @@
+import contextlib
+import os
+import tempfile
+import threading
+
+
+class DiskCache:
+    """
+    Cache de fichiers sur disque borné en taille, avec éviction LRU.
+    L'ordre d'utilisation est porté par la date de modification des fichiers,
+    rafraîchie à chaque lecture.
+    """
+
+    TMP_SUFFIX = ".part"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Verrou par entrée en cours d'écriture : nom -> [verrou, nombre d'utilisateurs]
+        self._writing = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self._total = self._scan()
+        # La limite a pu baisser depuis le dernier lancement
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def _scan(self) -> int:
+        """Calcule la taille occupée et supprime les écritures interrompues (nettoyage au démarrage)."""
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(self.TMP_SUFFIX):
+                with contextlib.suppress(OSError):
+                    os.remove(entry.path)
+                continue
+            total += entry.stat().st_size
+        return total
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> str | None:
+        """Retourne le chemin de l'entrée si elle existe, en la marquant comme récente."""
+        path = self.path_for(name)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def put(self, name: str, writer) -> str:
+        """
+        Écrit une entrée de façon atomique puis applique l'éviction.
+        Les écritures concurrentes d'une même entrée sont sérialisées : si elle
+        a été écrite entre-temps par un autre thread, elle est retournée telle quelle.
+        :param writer: fonction recevant le chemin temporaire à remplir
+        """
+        with self._lock:
+            verrou = self._writing.setdefault(name, [threading.Lock(), 0])
+            verrou[1] += 1
+        try:
+            with verrou[0]:
+                return self.get(name) or self._write(name, writer)
+        finally:
+            with self._lock:
+                verrou[1] -= 1
+                if not verrou[1]:
+                    del self._writing[name]
+
+    def _write(self, name: str, writer) -> str:
+        path = self.path_for(name)
+        # Fichier temporaire propre à cette écriture, supprimé au prochain démarrage s'il reste
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=name + ".", suffix=self.TMP_SUFFIX)
+        os.close(fd)
+        try:
+            writer(tmp)
+            with self._lock:
+                try:
+                    remplacee = os.path.getsize(path)
+                except OSError:
+                    remplacee = 0
+                os.replace(tmp, path)
+                self._total += os.path.getsize(path) - remplacee
+                if self._total > self.max_bytes:
+                    self._evict()
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+        return path
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées jusqu'à repasser sous la limite."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(self.TMP_SUFFIX):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                total -= size
+        self._total = total
+
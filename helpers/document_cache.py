@@ -0,0 +1,44 @@
+import os
+
+from .disk_cache import DiskCache
+
+DOCUMENT_CACHE_MB = int(os.environ.get("GESTION_DOCUMENT_CACHE_MB", 500))
+
+
+class DocumentCache:
+    """
+    Copies locales des documents partagés déjà ouverts, conservées dans
+    Documents/GestionVisiteur/documents et bornées en taille (éviction LRU).
+    Une entrée est nommée "<id>-<empreinte><extension>" : le contenu d'un
+    partage ne change jamais, et l'extension permet à l'application par
+    défaut de reconnaître le fichier.
+    """
+
+    def __init__(self, directory: str | None = None, max_bytes: int = DOCUMENT_CACHE_MB * 1024 * 1024):
+        directory = directory or os.path.join(os.path.expanduser("~"), "Documents", "GestionVisiteur", "documents")
+        self.cache = DiskCache(directory, max_bytes)
+
+    @staticmethod
+    def key(document_id: int, blob_hash: str | None, file_name: str | None) -> str:
+        # Documents d'avant la table blobs : pas d'empreinte, l'identifiant suffit
+        extension = os.path.splitext(file_name or "")[1].lower()
+        return f"{int(document_id)}-{blob_hash or 'inline'}{extension}"
+
+    def get(self, document_id: int) -> str | None:
+        """Chemin de la copie locale du document, sans accès à la base ; None si absente."""
+        prefixe = f"{int(document_id)}-"
+        for entry in os.scandir(self.cache.directory):
+            if entry.name.startswith(prefixe) and not entry.name.endswith(DiskCache.TMP_SUFFIX):
+                return self.cache.get(entry.name)
+        return None
+
+    def put(self, document_id: int, blob_hash: str | None, file_name: str | None, writer) -> str:
+        """
+        Ajoute un document au cache.
+        :param writer: fonction recevant un fichier binaire ouvert en écriture
+        """
+        def ecrire(tmp):
+            with open(tmp, "wb") as f:
+                writer(f)
+
+        return self.cache.put(self.key(document_id, blob_hash, file_name), ecrire)
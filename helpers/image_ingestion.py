@@ -0,0 +1,142 @@
+import logging
+import os
+import shutil
+from datetime import datetime
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Plus grand côté conservé : 2000px garde lisibles les mentions d'une pièce d'identité
+IMAGE_MAX_PX = int(os.environ.get("GESTION_IMAGE_MAX_PX", 2000))
+IMAGE_QUALITY = int(os.environ.get("GESTION_IMAGE_QUALITY", 80))
+# "jpeg" (progressif) ou "webp"
+IMAGE_FORMAT = os.environ.get("GESTION_IMAGE_FORMAT", "jpeg").lower()
+# Conserve une copie des fichiers choisis dans ID/originaux
+IMAGE_KEEP_ORIGINAL = os.environ.get("GESTION_IMAGE_KEEP_ORIGINAL", "").strip().lower() in ("1", "true", "yes", "on")
+
+EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+class ImageIngestion:
+    """
+    Prépare les images d'identité choisies par l'utilisateur avant leur
+    enregistrement dans Documents/GestionVisiteur/ID : orientation EXIF
+    appliquée, résolution plafonnée à `max_px`, réencodage en JPEG progressif
+    ou en WebP. Plusieurs pages (recto/verso, passeport et visa...) sont
+    empilées verticalement dans une seule image.
+    """
+
+    def __init__(self, directory: str | None = None, max_px: int = IMAGE_MAX_PX, quality: int = IMAGE_QUALITY,
+                 format: str = IMAGE_FORMAT, keep_original: bool = IMAGE_KEEP_ORIGINAL):
+        if format not in EXTENSIONS:
+            raise ValueError(f"Format d'image non pris en charge : {format}")
+        self.directory = directory or os.path.join(os.path.expanduser("~"), "Documents", "GestionVisiteur", "ID")
+        self.max_px = max_px
+        self.quality = quality
+        self.format = format
+        self.keep_original = keep_original
+
+    def ingerer(self, sources: list[str]) -> str:
+        """
+        Normalise une ou plusieurs pages et les enregistre en une seule image.
+        :return: le chemin de l'image enregistrée
+        """
+        if not sources:
+            raise ValueError("Aucune image sélectionnée.")
+        return self.composer([self.ouvrir(source) for source in sources], sources)
+
+    def composer(self, pages: list[Image.Image], sources: list[str]) -> str:
+        """
+        Empile des pages déjà ouvertes par `ouvrir` et enregistre le résultat.
+        :param sources: chemins d'origine des pages, pour le nom du fichier et les originaux
+        :return: le chemin de l'image enregistrée
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.keep_original:
+            self._conserver_originaux(sources)
+
+        # Chaque page est plafonnée séparément : l'empilement garde leur lisibilité
+        image = pages[0] if len(pages) == 1 else self.empiler(pages)
+
+        stems = [os.path.splitext(os.path.basename(source))[0] for source in sources]
+        nom = stems[0] if len(stems) == 1 else "fusion_de_" + "_et_".join(stems)
+        horodatage = datetime.now().strftime("%Y%m%d_%H%M%S")
+        destination = os.path.join(self.directory, f"{nom}_{horodatage}{EXTENSIONS[self.format]}")
+        self.enregistrer(image, destination)
+        return destination
+
+    def ouvrir(self, source: str) -> Image.Image:
+        """Ouvre une page, redressée selon son orientation EXIF et réduite à `max_px`."""
+        with Image.open(source) as img:
+            # draft() laisse le décodeur JPEG réduire l'image dès la lecture
+            img.draft("RGB", (self.max_px, self.max_px))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((self.max_px, self.max_px))
+            return self.aplatir(img)
+
+    @staticmethod
+    def aplatir(image: Image.Image) -> Image.Image:
+        """Convertit en RGB ; les zones transparentes deviennent blanches, comme le fond de `empiler`."""
+        if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+            image = image.convert("RGBA")
+            fond = Image.new("RGB", image.size, "white")
+            fond.paste(image, mask=image.getchannel("A"))
+            return fond
+        return image.convert("RGB")
+
+    @staticmethod
+    def empiler(pages: list[Image.Image]) -> Image.Image:
+        """Empile les pages verticalement, sur fond blanc."""
+        image = Image.new("RGB", (max(p.width for p in pages), sum(p.height for p in pages)), "white")
+        y = 0
+        for page in pages:
+            image.paste(page, (0, y))
+            y += page.height
+        return image
+
+    def enregistrer(self, image: Image.Image, destination: str) -> None:
+        # Écriture dans un fichier temporaire : une image à moitié écrite n'est jamais référencée
+        tmp = destination + ".part"
+        try:
+            if self.format == "webp":
+                image.save(tmp, "WEBP", quality=self.quality, method=6)
+            else:
+                image.save(tmp, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            os.replace(tmp, destination)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _conserver_originaux(self, sources: list[str]) -> None:
+        dossier = os.path.join(self.directory, "originaux")
+        os.makedirs(dossier, exist_ok=True)
+        for source in sources:
+            try:
+                shutil.copy2(source, os.path.join(dossier, os.path.basename(source)))
+            except OSError as e:
+                logger.error(f"Original non conservé pour {source} : {e}")
+
+
+if __name__ == "__main__":
+    # Taille avant / après sur un lot de photos :
+    #   GESTION_IMAGE_FORMAT=webp python -m helpers.image_ingestion <image> [<image> ...]
+    import sys
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as dossier:
+        ingestion = ImageIngestion(directory=dossier, keep_original=False)
+        total_avant = total_apres = 0
+        for source in sys.argv[1:]:
+            debut = time.perf_counter()
+            resultat = ingestion.ingerer([source])
+            duree = time.perf_counter() - debut
+            avant, apres = os.path.getsize(source), os.path.getsize(resultat)
+            total_avant += avant
+            total_apres += apres
+            with Image.open(source) as img, Image.open(resultat) as sortie:
+                print(f"{os.path.basename(source)[:31]:<32}{img.width}x{img.height} -> {sortie.width}x{sortie.height}"
+                      f"  {avant / 1024:9.0f} Ko -> {apres / 1024:7.0f} Ko  (x{avant / apres:4.1f}, {duree * 1000:.0f} ms)")
+        if total_apres:
+            print(f"Total : {total_avant / 2**20:.1f} Mo -> {total_apres / 2**20:.1f} Mo (x{total_avant / total_apres:.1f})")
@@ -0,0 +1,98 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+from kivy.graphics.texture import Texture
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+class ImageRequest:
+    """Demande de chargement annulable retournée par AsyncImageLoader.load()."""
+
+    def __init__(self, path: str, callback):
+        self.path = path
+        self.callback = callback
+        self.cancelled = False
+        self.done = False
+        self.future = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class AsyncImageLoader:
+    """
+    Décode les images dans un pool de threads borné et remet les textures au
+    thread Kivy via Clock. Le thread principal ne fait que l'envoi des pixels
+    au GPU, limité à `max_upload_per_frame` textures par frame.
+    """
+
+    def __init__(self, max_workers: int = 2, max_upload_per_frame: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-loader")
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self.max_upload_per_frame = max_upload_per_frame
+        self._trigger_upload = Clock.create_trigger(self._upload)
+
+    def load(self, path: str, callback, max_size: tuple[int, int] | None = None, transform=None) -> ImageRequest:
+        """
+        Demande le chargement de `path` ; `callback(texture)` est appelé sur le thread Kivy.
+        :param max_size: taille maximale de l'image décodée (None = taille réelle)
+        :param transform: fonction exécutée dans le worker pour obtenir le fichier à
+                          décoder (ex : ThumbnailCache.get)
+        """
+        request = ImageRequest(path, callback)
+        request.future = self._executor.submit(self._decode, request, max_size, transform)
+        return request
+
+    def _decode(self, request: ImageRequest, max_size, transform):
+        if request.cancelled:
+            return
+        try:
+            path = transform(request.path) if transform else request.path
+            with Image.open(path) as img:
+                if max_size:
+                    img.draft("RGB", max_size)
+                img = ImageOps.exif_transpose(img)
+                if max_size:
+                    img.thumbnail(max_size)
+                img = img.convert("RGBA")
+                size, pixels = img.size, img.tobytes()
+        except Exception as e:
+            logger.error(f"Chargement impossible de l'image {request.path} : {e}")
+            return
+
+        if request.cancelled:
+            return
+        with self._lock:
+            self._ready.append((request, size, pixels))
+        self._trigger_upload()
+
+    def _upload(self, dt):
+        for _ in range(self.max_upload_per_frame):
+            with self._lock:
+                if not self._ready:
+                    return
+                request, size, pixels = self._ready.popleft()
+            if request.cancelled:
+                continue
+
+            texture = Texture.create(size=size, colorfmt="rgba")
+            texture.blit_buffer(pixels, colorfmt="rgba", bufferfmt="ubyte")
+            texture.flip_vertical()
+            request.done = True
+            request.callback(texture)
+
+        # Il reste des textures : on continue à la frame suivante
+        with self._lock:
+            if self._ready:
+                self._trigger_upload()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
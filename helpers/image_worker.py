@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+
+from .image_ingestion import ImageIngestion
+
+logger = logging.getLogger(__name__)
+
+
+class ImageJob:
+    """Fusion de pages annulable retournée par ImageWorkerPool.merge()."""
+
+    def __init__(self, sources: list[str], on_done, on_progress, on_error):
+        self.sources = list(sources)
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.cancelled = False
+        self.done = False
+        self.futures = []
+        self.pages = [None] * len(self.sources)
+        self._restantes = len(self.sources)
+        self._echec = False
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        """Nombre d'étapes : une par page, plus l'assemblage et l'enregistrement."""
+        return len(self.sources) + 1
+
+    def cancel(self):
+        """Rien ne sera livré ; les pages pas encore commencées ne sont pas décodées."""
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+
+
+class ImageWorkerPool:
+    """
+    Traite les images d'identité (voir ImageIngestion) hors du thread Kivy.
+    Les pages d'une fusion (recto/verso, passeport et visas...) sont décodées
+    en parallèle dans un pool de threads borné — Pillow libère le GIL pendant
+    le décodage, la réduction et l'encodage — puis assemblées dans une
+    dernière étape. Progression, résultat et erreurs sont remis au thread Kivy
+    via Clock.
+    """
+
+    def __init__(self, ingestion: ImageIngestion | None = None, max_workers: int = min(4, os.cpu_count() or 1)):
+        self.ingestion = ingestion or ImageIngestion()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-worker")
+
+    def merge(self, sources: list[str], on_done, on_progress=None, on_error=None) -> ImageJob:
+        """
+        Normalise une ou plusieurs pages et les enregistre en une seule image.
+        :param on_done: appelée avec le chemin de l'image enregistrée
+        :param on_progress: appelée avec (étapes terminées, nombre d'étapes)
+        :param on_error: appelée avec l'exception ; sinon l'erreur est journalisée
+        """
+        if not sources:
+            raise ValueError("Aucune image sélectionnée.")
+        job = ImageJob(sources, on_done, on_progress, on_error)
+        job.futures = [
+            self._executor.submit(self._ouvrir, job, index, source)
+            for index, source in enumerate(job.sources)
+        ]
+        return job
+
+    def _ouvrir(self, job: ImageJob, index: int, source: str):
+        if job.cancelled or job._echec:
+            return
+        try:
+            page = self.ingestion.ouvrir(source)
+        except Exception as e:
+            self._echouer(job, e)
+            return
+
+        with job._lock:
+            if job._echec:
+                return
+            job.pages[index] = page
+            job._restantes -= 1
+            restantes = job._restantes
+        self._progresser(job, len(job.sources) - restantes)
+        if restantes == 0 and not job.cancelled:
+            job.futures.append(self._executor.submit(self._composer, job))
+
+    def _composer(self, job: ImageJob):
+        if job.cancelled:
+            return
+        try:
+            chemin = self.ingestion.composer(job.pages, job.sources)
+        except Exception as e:
+            self._echouer(job, e)
+            return
+        finally:
+            job.pages = None
+
+        self._progresser(job, job.total)
+        Clock.schedule_once(lambda dt: self._livrer(job, chemin))
+
+    def _livrer(self, job: ImageJob, chemin: str):
+        job.done = True
+        if job.cancelled:
+            # Annulée pendant l'enregistrement : l'image n'est référencée nulle part
+            try:
+                os.remove(chemin)
+            except OSError:
+                pass
+            return
+        job.on_done(chemin)
+
+    def _progresser(self, job: ImageJob, faites: int):
+        if job.on_progress:
+            Clock.schedule_once(lambda dt: job.cancelled or job.on_progress(faites, job.total))
+
+    def _echouer(self, job: ImageJob, erreur: Exception):
+        with job._lock:
+            if job._echec:
+                return
+            job._echec = True
+            job.pages = None
+        Clock.schedule_once(lambda dt: self._signaler(job, erreur))
+
+    @staticmethod
+    def _signaler(job: ImageJob, erreur: Exception):
+        job.done = True
+        if job.cancelled:
+            return
+        if job.on_error:
+            job.on_error(erreur)
+        else:
+            logger.error(f"L'erreur suivante vient de se produire {erreur}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
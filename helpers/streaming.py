@@ -0,0 +1,151 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+
+# Formats reconnus d'après l'extension du fichier
+FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+# Compressions reconnues d'après l'extension finale
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+def detecter_compression(chemin: str) -> str | None:
+    return COMPRESSIONS.get(os.path.splitext(chemin)[1].lower())
+
+
+def detecter_format(chemin: str, format: str | None = None) -> str:
+    """Retourne le format demandé ou celui déduit de l'extension (ex : visiteurs.ndjson.gz)."""
+    if format:
+        return format
+    racine, ext = os.path.splitext(chemin)
+    if ext.lower() in COMPRESSIONS:
+        ext = os.path.splitext(racine)[1]
+    if ext.lower() not in FORMATS:
+        raise ValueError(f"Format de fichier non reconnu : {chemin}")
+    return FORMATS[ext.lower()]
+
+
+def ouvrir_texte(chemin: str, mode: str = "r", compression: str | None = None):
+    """
+    Ouvre un fichier texte UTF-8, compressé ou non.
+    :param mode: "r" ou "w"
+    :param compression: None, "gzip" ou "zstd" ; déduite de l'extension par défaut
+    """
+    compression = compression or detecter_compression(chemin)
+    if compression == "gzip":
+        return gzip.open(chemin, mode + "t", encoding="utf-8", newline="")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ValueError("La compression zstd nécessite le paquet 'zstandard'.") from e
+        return zstandard.open(chemin, mode + "t", encoding="utf-8", newline="")
+    if compression:
+        raise ValueError(f"Compression inconnue : {compression}")
+    return open(chemin, mode, encoding="utf-8", newline="")
+
+
+def iter_json_array(fichier, taille_bloc: int = 64 * 1024):
+    """
+    Itère sur les éléments d'un tableau JSON sans charger tout le fichier :
+    seuls le bloc courant et l'élément en cours de lecture sont en mémoire.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    ouvert = False
+    fin_fichier = False
+
+    while True:
+        # Sauter les blancs et les virgules entre éléments
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+
+        if pos >= len(buffer) or (ouvert and buffer[pos] != "]" and len(buffer) - pos < taille_bloc):
+            if not fin_fichier:
+                bloc = fichier.read(taille_bloc)
+                fin_fichier = not bloc
+                buffer = buffer[pos:] + bloc
+                pos = 0
+                continue
+            if pos >= len(buffer):
+                raise ValueError("Tableau JSON incomplet.")
+
+        if not ouvert:
+            if buffer[pos] != "[":
+                raise ValueError("Le fichier JSON doit contenir un tableau d'objets.")
+            ouvert = True
+            pos += 1
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            element, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if fin_fichier:
+                raise
+            # Élément plus grand que le bloc : on lit la suite
+            bloc = fichier.read(taille_bloc)
+            fin_fichier = not bloc
+            buffer = buffer[pos:] + bloc
+            pos = 0
+            continue
+        yield element
+
+
+def iter_records(fichier, format: str):
+    """
+    Itère sur les enregistrements d'un fichier ouvert en mode texte.
+    :param format: "json" (tableau), "ndjson" (un objet par ligne) ou "csv" (avec en-tête)
+    :return: générateur de tuples (numéro d'enregistrement, dict)
+    """
+    if format == "json":
+        yield from enumerate(iter_json_array(fichier), start=1)
+    elif format == "ndjson":
+        for numero, ligne in enumerate(fichier, start=1):
+            if ligne.strip():
+                yield numero, json.loads(ligne)
+    elif format == "csv":
+        # Pas de seek() : les flux compressés ne savent pas revenir en arrière
+        debut = fichier.read(4096) + fichier.readline()
+        try:
+            dialect = csv.Sniffer().sniff(debut, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        lignes = itertools.chain(io.StringIO(debut), fichier)
+        # La ligne 1 est l'en-tête
+        yield from enumerate(csv.DictReader(lignes, dialect=dialect), start=2)
+    else:
+        raise ValueError(f"Format inconnu : {format}")
+
+
+def ecrire_records(fichier, format: str, records, colonnes: list[str]) -> int:
+    """
+    Écrit des dictionnaires au fil de l'eau dans un fichier ouvert en mode texte.
+    :param format: "json" (tableau), "ndjson" ou "csv"
+    :param records: itérable de dict, consommé une seule fois
+    :return: le nombre d'enregistrements écrits
+    """
+    nombre = 0
+    if format == "csv":
+        writer = csv.DictWriter(fichier, fieldnames=colonnes)
+        writer.writeheader()
+        for nombre, record in enumerate(records, start=1):
+            writer.writerow(record)
+    elif format == "ndjson":
+        for nombre, record in enumerate(records, start=1):
+            fichier.write(json.dumps(record, ensure_ascii=False))
+            fichier.write("\n")
+    elif format == "json":
+        fichier.write("[")
+        for nombre, record in enumerate(records, start=1):
+            fichier.write(",\n    " if nombre > 1 else "\n    ")
+            fichier.write(json.dumps(record, ensure_ascii=False))
+        fichier.write("\n]\n" if nombre else "]\n")
+    else:
+        raise ValueError(f"Format inconnu : {format}")
+    return nombre
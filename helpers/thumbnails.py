@@ -0,0 +1,55 @@
+import hashlib
+import logging
+import os
+
+from PIL import Image, ImageOps
+
+from .disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Les tuiles de la grille font 200dp : 400px couvre aussi les écrans HiDPI
+THUMBNAIL_SIZE = (400, 400)
+THUMBNAIL_CACHE_MB = int(os.environ.get("GESTION_THUMBNAIL_CACHE_MB", 200))
+
+
+class ThumbnailCache:
+    """
+    Génère une seule fois des miniatures JPEG des images d'identité et les
+    conserve dans Documents/GestionVisiteur/thumbnails.
+    La clé dépend du chemin, de la date de modification et de la taille du
+    fichier source : une image modifiée produit une nouvelle miniature.
+    """
+
+    def __init__(self, directory: str | None = None, max_bytes: int = THUMBNAIL_CACHE_MB * 1024 * 1024,
+                 size: tuple[int, int] = THUMBNAIL_SIZE):
+        directory = directory or os.path.join(os.path.expanduser("~"), "Documents", "GestionVisiteur", "thumbnails")
+        self.cache = DiskCache(directory, max_bytes)
+        self.size = size
+
+    def key(self, image_path: str) -> str:
+        st = os.stat(image_path)
+        raw = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}|{self.size}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest() + ".jpg"
+
+    def get(self, image_path: str) -> str:
+        """
+        Retourne le chemin de la miniature de `image_path`, en la générant si besoin.
+        En cas d'erreur, le chemin d'origine est renvoyé pour ne pas bloquer l'affichage.
+        """
+        if not image_path:
+            return ""
+        try:
+            name = self.key(image_path)
+            return self.cache.get(name) or self.cache.put(name, lambda tmp: self._generate(image_path, tmp))
+        except Exception as e:
+            logger.error(f"Miniature impossible pour {image_path} : {e}")
+            return image_path
+
+    def _generate(self, image_path: str, destination: str):
+        with Image.open(image_path) as img:
+            # draft() laisse le décodeur JPEG réduire l'image dès la lecture
+            img.draft("RGB", self.size)
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(self.size)
+            img.convert("RGB").save(destination, "JPEG", quality=85)
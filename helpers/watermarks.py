@@ -0,0 +1,38 @@
+import json
+import os
+import threading
+
+# Partagé par toutes les instances : elles peuvent viser le même fichier
+_lock = threading.Lock()
+
+
+class WatermarkStore:
+    """
+    Petits marqueurs persistants (dernier identifiant traité, etc.) conservés
+    dans un fichier JSON du dossier de travail. L'écriture est atomique.
+    """
+
+    def __init__(self, chemin: str | None = None):
+        self.chemin = chemin or os.path.join(os.path.expanduser("~"), "Documents", "GestionVisiteur", "watermarks.json")
+        self._lock = _lock
+
+    def _lire(self) -> dict:
+        try:
+            with open(self.chemin, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, cle: str, defaut=None):
+        with self._lock:
+            return self._lire().get(cle, defaut)
+
+    def set(self, cle: str, valeur) -> None:
+        with self._lock:
+            donnees = self._lire()
+            donnees[cle] = valeur
+            os.makedirs(os.path.dirname(self.chemin), exist_ok=True)
+            tmp = self.chemin + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(donnees, f)
+            os.replace(tmp, self.chemin)
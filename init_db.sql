@@ -1,3 +1,6 @@
+-- Schéma de référence. Au démarrage, l'application applique elle-même les
+-- migrations en attente (managers/migrations.py, suivies dans schema_version).
+
 -- Créer la base de données
 CREATE DATABASE gestion_visiteurs;
 
@@ -23,12 +26,31 @@ CREATE TABLE IF NOT EXISTS public.visitors (
     phone_number VARCHAR NOT NULL,
     place_of_birth VARCHAR NOT NULL,
     motif VARCHAR NOT NULL,
-    date VARCHAR NOT NULL,
-    arrival_time VARCHAR NOT NULL,
+    date DATE DEFAULT CURRENT_DATE NOT NULL,
+    arrival_time TIME DEFAULT LOCALTIME(0) NOT NULL,
     exit_time VARCHAR,
     observation TEXT
 );
 
+-- Créer la table blobs (contenus partagés, dédupliqués par empreinte SHA-256)
+CREATE TABLE IF NOT EXISTS public.blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    ref_count INTEGER DEFAULT 1 NOT NULL,
+    codec VARCHAR(8) DEFAULT 'raw' NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Créer la table blob_chunks (contenu des blobs, par morceaux)
+CREATE TABLE IF NOT EXISTS public.blob_chunks (
+    blob_hash VARCHAR(64) NOT NULL REFERENCES blobs(hash) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (blob_hash, seq)
+);
+-- Morceaux déjà compressés ou binaires : pas de recompression TOAST
+ALTER TABLE blob_chunks ALTER COLUMN data SET STORAGE EXTERNAL;
+
 -- Créer la table visitor_shares
 CREATE TABLE IF NOT EXISTS public.visitor_shares (
     id SERIAL PRIMARY KEY,
@@ -38,7 +60,8 @@ CREATE TABLE IF NOT EXISTS public.visitor_shares (
     place_of_birth VARCHAR NOT NULL,
     phone_number VARCHAR NOT NULL,
     motif TEXT,
-    image_data BYTEA NOT NULL,
+    image_data BYTEA,
+    blob_hash VARCHAR(64) REFERENCES blobs(hash),
     shared_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL,
     status VARCHAR DEFAULT 'active' NOT NULL,
     CONSTRAINT no_self_share CHECK (shared_by_user_id != shared_with_user_id)
@@ -51,6 +74,8 @@ CREATE TABLE IF NOT EXISTS public.document_shares (
     shared_to_user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     file BYTEA,
     file_name VARCHAR,
+    file_size BIGINT,
+    blob_hash VARCHAR(64) REFERENCES blobs(hash),
     document_type VARCHAR(50),
     shared_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL,
     status VARCHAR DEFAULT 'active' NOT NULL,
@@ -66,9 +91,20 @@ CREATE TABLE IF NOT EXISTS public.password_reset_tokens (
 );
 
 -- Indexes
+CREATE INDEX IF NOT EXISTS idx_visitors_date ON visitors(date);
+
+-- Recherche plein texte (sous-chaînes) sur les visiteurs
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_visitors_phone_number_trgm ON visitors USING gin (phone_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_visitors_place_of_birth_trgm ON visitors USING gin (place_of_birth gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_visitors_motif_trgm ON visitors USING gin (motif gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_visitors_observation_trgm ON visitors USING gin (observation gin_trgm_ops);
+
 CREATE INDEX IF NOT EXISTS idx_visitor_shares_visitor_id ON visitor_shares(visitor_id);
-CREATE INDEX IF NOT EXISTS idx_visitor_shares_user_id ON visitor_shares(shared_with_user_id);
-CREATE INDEX IF NOT EXISTS idx_document_shares_user_id ON document_shares(shared_to_user_id);
+CREATE INDEX IF NOT EXISTS idx_visitor_shares_user_id_id ON visitor_shares(shared_with_user_id, id);
+CREATE INDEX IF NOT EXISTS idx_document_shares_user_id_id ON document_shares(shared_to_user_id, id);
+CREATE INDEX IF NOT EXISTS idx_visitor_shares_blob_hash ON visitor_shares(blob_hash);
+CREATE INDEX IF NOT EXISTS idx_document_shares_blob_hash ON document_shares(blob_hash);
 
 -- Séquences
 SELECT setval(pg_get_serial_sequence('users','id'), COALESCE(MAX(id), 0), false) FROM users;
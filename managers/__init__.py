@@ -1,3 +1,6 @@
+from .database import Database, get_database
 from .user_manager import UserManager
 from .visitor_manager import VisitorManager
-from .document_manager import DocumentManager
\ No newline at end of file
+from .blob_store import BlobStore
+from .document_manager import DocumentManager
+from .notifications import ShareListener, push_disponible
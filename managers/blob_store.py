@@ -0,0 +1,134 @@
+import hashlib
+import os
+from collections import Counter
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from helpers.compression import choisir_codec, compresser, decompresser
+from models import Blob, BlobChunk
+
+# Taille d'un morceau : borne la mémoire à l'envoi comme à la lecture
+TAILLE_MORCEAU = int(os.environ.get("GESTION_DOC_CHUNK_KB", 1024)) * 1024
+# Nombre de morceaux lus par aller-retour lors d'une lecture
+MORCEAUX_PAR_LOT = 4
+
+
+def empreinte_fichier(chemin: str) -> tuple[str, int]:
+    """Empreinte SHA-256 (hexadécimale) et taille d'un fichier, lu par morceaux."""
+    empreinte = hashlib.sha256()
+    taille = 0
+    with open(chemin, "rb") as f:
+        for morceau in iter(lambda: f.read(TAILLE_MORCEAU), b""):
+            empreinte.update(morceau)
+            taille += len(morceau)
+    return empreinte.hexdigest(), taille
+
+
+class BlobStore:
+    """
+    Contenus partagés adressés par leur empreinte SHA-256 (tables blobs et
+    blob_chunks). Un même fichier envoyé à plusieurs destinataires n'est
+    stocké qu'une fois ; `ref_count` compte les partages qui le référencent
+    et le contenu est supprimé quand plus aucun ne le fait.
+
+    Les morceaux sont compressés de façon transparente, sauf pour les formats
+    déjà compressés (JPEG, ZIP/Office...) ; le codec est enregistré avec le blob.
+
+    Les écritures se font dans la session de l'appelant, qui garde la main
+    sur le commit : le partage et son contenu sont enregistrés ensemble.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def stocker_fichier(self, session, chemin: str, progression=None, references: int = 1) -> str:
+        """
+        Référence le contenu d'un fichier, en ne l'envoyant que s'il n'est pas déjà stocké.
+        :param progression: appelée avec (octets envoyés, taille totale) après chaque morceau
+        :param references: nombre de partages qui vont pointer vers ce contenu
+        :return: l'empreinte du contenu
+        """
+        cle, taille = empreinte_fichier(chemin)
+        if self._referencer(session, cle, references):
+            if progression:
+                progression(taille, taille)
+            return cle
+
+        with open(chemin, "rb") as f:
+            codec = choisir_codec(f.read(TAILLE_MORCEAU))
+        try:
+            # Point de sauvegarde : un autre poste peut envoyer le même contenu au même moment
+            with session.begin_nested():
+                session.execute(
+                    insert(Blob.__table__), {"hash": cle, "size": taille, "ref_count": references, "codec": codec}
+                )
+                self._envoyer(session, cle, chemin, taille, codec, progression)
+        except IntegrityError:
+            if not self._referencer(session, cle, references):
+                raise
+        return cle
+
+    def _envoyer(self, session, cle: str, chemin: str, taille: int, codec: str, progression) -> None:
+        empreinte = hashlib.sha256()
+        envoyes = 0
+        with open(chemin, "rb") as f:
+            for seq, morceau in enumerate(iter(lambda: f.read(TAILLE_MORCEAU), b"")):
+                empreinte.update(morceau)
+                session.execute(
+                    insert(BlobChunk.__table__),
+                    {"blob_hash": cle, "seq": seq, "data": compresser(morceau, codec)},
+                )
+                envoyes += len(morceau)
+                if progression:
+                    progression(envoyes, taille)
+        if empreinte.hexdigest() != cle:
+            raise ValueError(f"Le fichier {chemin} a été modifié pendant l'envoi.")
+
+    @staticmethod
+    def _referencer(session, cle: str, references: int = 1) -> bool:
+        """Ajoute des références à un contenu existant ; False s'il n'est pas stocké."""
+        resultat = session.execute(
+            update(Blob).where(Blob.hash == cle).values(ref_count=Blob.ref_count + references)
+        )
+        return resultat.rowcount > 0
+
+    @staticmethod
+    def liberer(session, cle: str, references: int = 1) -> None:
+        """Retire des références ; le contenu est supprimé à la dernière."""
+        session.execute(update(Blob).where(Blob.hash == cle).values(ref_count=Blob.ref_count - references))
+        restantes = session.execute(select(Blob.ref_count).where(Blob.hash == cle)).scalar()
+        if restantes is not None and restantes <= 0:
+            session.execute(delete(BlobChunk).where(BlobChunk.blob_hash == cle))
+            session.execute(delete(Blob).where(Blob.hash == cle))
+
+    def supprimer_partages(self, session, modele, *conditions) -> None:
+        """
+        Supprime des partages (modele : VisitorShare ou DocumentShare) en libérant
+        les références de leur contenu. À appeler avant toute suppression qui les
+        emporterait par ON DELETE CASCADE (visiteur, utilisateur).
+        """
+        cles = session.scalars(select(modele.blob_hash).where(*conditions, modele.blob_hash.is_not(None))).all()
+        session.execute(delete(modele).where(*conditions))
+        for cle, references in Counter(cles).items():
+            self.liberer(session, cle, references)
+
+    def detacher(self, session, share) -> None:
+        """Détache le contenu d'un partage (VisitorShare ou DocumentShare) et libère sa référence."""
+        cle = share.blob_hash
+        if cle is None:
+            return
+        share.blob_hash = None
+        session.flush()
+        self.liberer(session, cle)
+
+    def iter_blob(self, cle: str):
+        """
+        Contenu décompressé, morceau par morceau, lu par lots de MORCEAUX_PAR_LOT.
+        Utilise sa propre connexion : la session du thread reste libre pendant la lecture.
+        """
+        with self.engine.connect() as conn:
+            codec = conn.execute(select(Blob.codec).where(Blob.hash == cle)).scalar()
+            morceaux = conn.execution_options(yield_per=MORCEAUX_PAR_LOT).execute(
+                select(BlobChunk.data).where(BlobChunk.blob_hash == cle).order_by(BlobChunk.seq)
+            )
+            for (morceau,) in morceaux:
+                yield decompresser(morceau, codec)
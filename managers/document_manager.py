@@ -1,34 +1,145 @@
-from models.documentshare import DocumentShare
-from managers.user_manager import UserManager
+from models import DocumentShare, ShareInboxItem, User
+from managers.blob_store import BlobStore, TAILLE_MORCEAU
+from managers.database import Database, get_database
 from datetime import datetime
+from sqlalchemy import insert, select
+import os
 
 class DocumentManager:
-    def __init__(self):
-        self.session = UserManager().Session()
-
-    def share_document(self, from_user_id, to_user_id, document_path, document_type):
-        file_name = document_path.split("/")[-1]
-        share = DocumentShare(
-            shared_by_user_id=from_user_id,
-            shared_to_user_id=to_user_id,
-            file=open(document_path, "rb").read(),
-            file_name=file_name,
-            document_type=document_type,
-            shared_at=datetime.now(),
-            status="active"
-        )
-        self.session.add(share)
-        self.session.commit()
-        return share
+    def __init__(self, database: Database | None = None):
+        database = database or get_database()
+        # Registre de sessions partagé : une session par thread, même engine pour tous les managers
+        self.Session = database.Session
+        self.engine = database.engine
+        self.blobs = BlobStore(database.engine)
+
+    @property
+    def session(self):
+        """Session du thread courant (scoped_session)."""
+        return self.Session()
+
+    def share_document(self, from_user_id, to_user_id, document_path, document_type, progression=None):
+        """
+        Partage un fichier avec un destinataire (voir share_document_many).
+        :return: le DocumentShare créé
+        """
+        if to_user_id == from_user_id:
+            raise ValueError("Impossible de partager un document avec soi-même.")
+        share_id = self.share_document_many(from_user_id, [to_user_id], document_path, document_type, progression)[0]
+        session = self.session
+        try:
+            return session.get(DocumentShare, share_id)
+        finally:
+            session.close()
+
+    def share_document_many(self, from_user_id, to_user_ids, document_path, document_type, progression=None) -> list[int]:
+        """
+        Partage un fichier avec plusieurs destinataires en une seule transaction.
+        Son contenu est stocké une seule fois par empreinte (BlobStore) : s'il a
+        déjà été partagé, rien n'est renvoyé. Sinon il est envoyé par morceaux
+        de TAILLE_MORCEAU octets, un seul à la fois en mémoire. Les partages
+        sont insérés en un seul lot, avec leur contenu.
+        :param progression: appelée avec (octets envoyés, taille totale) après chaque morceau
+        :return: les identifiants des partages créés
+        """
+        destinataires = sorted(set(to_user_ids) - {from_user_id})
+        if not destinataires:
+            return []
+
+        session = self.session
+        try:
+            cle = self.blobs.stocker_fichier(session, document_path, progression, references=len(destinataires))
+            commun = {
+                "shared_by_user_id": from_user_id,
+                "file_name": os.path.basename(document_path),
+                "file_size": os.path.getsize(document_path),
+                "blob_hash": cle,
+                "document_type": document_type,
+                "shared_at": datetime.now(),
+                "status": "active",
+            }
+            ids = session.scalars(
+                insert(DocumentShare).returning(DocumentShare.id),
+                [{**commun, "shared_to_user_id": destinataire} for destinataire in destinataires],
+            ).all()
+            session.commit()
+            return ids
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def iter_document(self, document_id: int):
+        """
+        Contenu d'un document, morceau par morceau (voir BlobStore.iter_blob).
+        Les documents enregistrés avant la table blobs sont rendus en un seul morceau.
+        """
+        with self.engine.connect() as conn:
+            cle = conn.execute(
+                select(DocumentShare.blob_hash).where(DocumentShare.id == document_id)
+            ).scalar()
+            ancien = None
+            if cle is None:
+                ancien = conn.execute(
+                    select(DocumentShare.file).where(DocumentShare.id == document_id)
+                ).scalar()
+
+        if cle is not None:
+            yield from self.blobs.iter_blob(cle)
+        elif ancien:
+            yield ancien
+
+    def infos_document(self, document_id: int):
+        """
+        Nom, taille et empreinte du contenu d'un document, sans le contenu.
+        :return: ligne (file_name, file_size, blob_hash), None si le document n'existe pas
+        """
+        session = self.session
+        try:
+            return session.execute(
+                select(DocumentShare.file_name, DocumentShare.file_size, DocumentShare.blob_hash)
+                .where(DocumentShare.id == document_id)
+            ).first()
+        finally:
+            session.close()
+
+    def telecharger_document(self, document_id: int, fichier, progression=None):
+        """
+        Écrit un document dans `fichier` (objet binaire ouvert en écriture) sans
+        jamais le charger entièrement en mémoire.
+        :param progression: appelée avec (octets reçus, taille totale ou None) après chaque morceau
+        :return: le nom du fichier, None si le document n'existe pas
+        """
+        infos = self.infos_document(document_id)
+        if infos is None:
+            return None
+
+        recus = 0
+        for morceau in self.iter_document(document_id):
+            fichier.write(morceau)
+            recus += len(morceau)
+            if progression:
+                progression(recus, infos.file_size)
+        return infos.file_name
 
     def get_document_blob(self, document_id: int):
         """
-        Récupère le contenu binaire et le nom du fichier depuis la base PostgreSQL via SQLAlchemy.
+        Récupère le contenu binaire complet et le nom du fichier.
+        Réservé aux petits fichiers : préférer telecharger_document.
         :param document_id: identifiant du document
         :return: tuple (fichier_blob, nom_fichier)
         """
-        document = self.session.query(DocumentShare).filter_by(id=document_id).first()
-        return (document.file, document.file_name) if document else (None, None)
+        session = self.session
+        try:
+            file_name = session.execute(
+                select(DocumentShare.file_name).where(DocumentShare.id == document_id)
+            ).scalar()
+        finally:
+            session.close()
+        if file_name is None:
+            return None, None
+        return b"".join(self.iter_document(document_id)), file_name
 
     def get_shares_for_user(self, user_id):
         return (
@@ -40,20 +151,44 @@ class DocumentManager:
             .all()
         )
     
-    def get_active_shares_for_user(self, user_id):
-        return self.session.query(DocumentShare).filter_by(shared_to_user_id=user_id, status="active").all()
-    
-    def edit_share_status(self, share: DocumentShare):
+    def get_inbox_for_user(self, user_id: int, statuts: tuple | None = None, apres_id: int = 0) -> list[ShareInboxItem]:
         """
-        Met à jour le statut d'un partage en notified
+        Boîte de réception des documents partagés, en une seule requête :
+        expéditeur joint, sans le fichier, triée par date de partage.
 
         Args:
-            share : Est un objet DocumentShare
+            user_id : destinataire des partages
+            statuts : statuts retenus, tous sauf "revoked" par défaut
+            apres_id : ne retourne que les partages d'identifiant supérieur (repère)
         """
+        requete = (
+            select(
+                DocumentShare.id, DocumentShare.shared_by_user_id, User.nom, User.prenom,
+                DocumentShare.shared_at, DocumentShare.status,
+                DocumentShare.document_type, DocumentShare.file_name,
+            )
+            .join(DocumentShare.shared_by)
+            .where(DocumentShare.shared_to_user_id == user_id)
+            .order_by(DocumentShare.shared_at, DocumentShare.id)
+        )
+        if apres_id:
+            requete = requete.where(DocumentShare.id > apres_id)
+        if statuts is None:
+            requete = requete.where(DocumentShare.status != "revoked")
+        else:
+            requete = requete.where(DocumentShare.status.in_(statuts))
+
         session = self.session
         try:
-            share.status = "notified"
-            session.commit()
+            return [
+                ShareInboxItem(
+                    id=ligne.id, type="document", shared_by_user_id=ligne.shared_by_user_id,
+                    expediteur_nom=ligne.nom, expediteur_prenom=ligne.prenom,
+                    shared_at=ligne.shared_at, status=ligne.status,
+                    document_type=ligne.document_type, file_name=ligne.file_name,
+                )
+                for ligne in session.execute(requete)
+            ]
         finally:
             session.close()
 
@@ -62,5 +197,64 @@ class DocumentManager:
         if not share or share.status != "active":
             return False
         share.status = "revoked"
+        # Le contenu n'est plus lisible : sa référence est libérée
+        self.blobs.detacher(self.session, share)
         self.session.commit()
-        return True
\ No newline at end of file
+        return True
+
+
+if __name__ == "__main__":
+    # Mesure de l'envoi et de la lecture par morceaux, puis d'un second envoi du même fichier (dédupliqué) :
+    #   GESTION_DB_URL=... python -m managers.document_manager <id expéditeur> <id destinataire> [taille en Mo, 500 par défaut]
+    # Les partages de test sont supprimés à la fin.
+    import filecmp
+    import sys
+    import tempfile
+    import time
+    import tracemalloc
+    from sqlalchemy import delete
+
+    expediteur, destinataire = int(sys.argv[1]), int(sys.argv[2])
+    taille_mo = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    manager = DocumentManager()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        source = os.path.join(dossier, "benchmark.bin")
+        copie = os.path.join(dossier, "copie.bin")
+        with open(source, "wb") as f:
+            for _ in range(taille_mo):
+                f.write(os.urandom(1 << 20))
+
+        tracemalloc.start()
+        debut = time.perf_counter()
+        share = manager.share_document(expediteur, destinataire, source, "bin")
+        duree_envoi = time.perf_counter() - debut
+        pic_envoi = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.reset_peak()
+        debut = time.perf_counter()
+        with open(copie, "wb") as f:
+            manager.telecharger_document(share.id, f)
+        duree_lecture = time.perf_counter() - debut
+        pic_lecture = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        debut = time.perf_counter()
+        doublon = manager.share_document(expediteur, destinataire, source, "bin")
+        duree_doublon = time.perf_counter() - debut
+
+        identiques = filecmp.cmp(source, copie, shallow=False)
+        session = manager.session
+        try:
+            for partage in (share, doublon):
+                partage = session.merge(partage)
+                manager.blobs.detacher(session, partage)
+                session.execute(delete(DocumentShare).where(DocumentShare.id == partage.id))
+            session.commit()
+        finally:
+            session.close()
+
+    print(f"Fichier : {taille_mo} Mo, morceaux de {TAILLE_MORCEAU // 1024} Ko, copie identique : {identiques}")
+    print(f"Envoi   : {duree_envoi:.1f} s ({taille_mo / duree_envoi:.1f} Mo/s), pic mémoire Python {pic_envoi / 2**20:.1f} Mo")
+    print(f"Lecture : {duree_lecture:.1f} s ({taille_mo / duree_lecture:.1f} Mo/s), pic mémoire Python {pic_lecture / 2**20:.1f} Mo")
+    print(f"Second envoi (contenu déjà stocké) : {duree_doublon:.2f} s, même contenu : {doublon.blob_hash == share.blob_hash}")
@@ -0,0 +1,621 @@
+import hashlib
+import sqlite3
+from datetime import datetime
+from sqlalchemy import (
+    CheckConstraint, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, Text,
+    func, inspect, insert, select, text
+)
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.types import Date
+from models.user import Base
+from helpers import setup_logger
+
+logger = setup_logger()
+
+# Colonnes de `visitors` couvertes par la recherche
+COLONNES_RECHERCHE = ("phone_number", "place_of_birth", "motif", "observation")
+
+# Formats acceptés pour les dates et heures saisies en texte libre avant la migration 2
+FORMATS_DATE = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y")
+FORMATS_HEURE = ("%H:%M:%S", "%H:%M", "%Hh%M", "%Hh")
+# Valeurs de remplacement des saisies illisibles
+DATE_ILLISIBLE = "1970-01-01"
+HEURE_ILLISIBLE = "00:00:00"
+
+# Clé du verrou consultatif PostgreSQL : un seul poste migre à la fois
+VERROU_MIGRATIONS = 7_420_001
+
+# Table de suivi, volontairement hors de Base.metadata
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+
+def appliquer_migrations(engine) -> int:
+    """
+    Amène le schéma à la dernière version.
+    La version est lue une seule fois : si elle est à jour, aucune autre requête
+    n'est faite. Sinon seules les migrations en attente sont appliquées, chacune
+    dans sa propre transaction.
+    :return: la version du schéma après migration
+    """
+    version = _version_courante(engine)
+    if version >= VERSION_SCHEMA:
+        return version
+
+    if version == 0:
+        # Première exécution : la table de suivi est créée sous le verrou, un
+        # seul des postes démarrés en même temps la crée
+        with engine.begin() as conn:
+            _verrouiller(conn)
+            schema_version.create(conn, checkfirst=True)
+
+    for numero, description, migration in MIGRATIONS:
+        if numero <= version:
+            continue
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                _verrouiller(conn)
+                # Un autre poste a pu appliquer la migration pendant l'attente du verrou
+                if (conn.execute(select(func.max(schema_version.c.version))).scalar() or 0) >= numero:
+                    continue
+            migration(conn)
+            conn.execute(insert(schema_version).values(version=numero, description=description))
+        logger.info(f"Migration {numero} appliquée : {description}")
+
+    return VERSION_SCHEMA
+
+
+def _version_courante(engine) -> int:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # Première exécution : la table de suivi n'existe pas encore
+        return 0
+
+
+def _verrouiller(conn) -> None:
+    """PostgreSQL : verrou consultatif de la transaction, un seul poste migre à la fois."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:cle)"), {"cle": VERROU_MIGRATIONS})
+
+
+"""
+Migrations. Chacune reçoit une connexion déjà en transaction et doit rester
+applicable sur une base créée par init_db.sql comme par une version antérieure
+de l'application. Les tables sont créées depuis des définitions figées et non
+depuis les modèles courants, qui évoluent : le résultat d'une migration ne doit
+pas changer avec eux (seule exception : _reconstruire_sqlite).
+"""
+
+# Schéma de la version 1, figé : tables de init_db.sql avant toute migration.
+# Ne pas modifier ; les évolutions passent par une nouvelle migration.
+schema_v1 = MetaData()
+
+Table(
+    "users", schema_v1,
+    Column("id", Integer, primary_key=True),
+    Column("nom", String(50)),
+    Column("prenom", String(50)),
+    Column("email", String(100), unique=True, nullable=False),
+    Column("password_hash", String(128), nullable=False),
+    Column("structure", String(100), nullable=False),
+    Column("role", String(20), server_default="utilisateur", nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+Table(
+    "visitors", schema_v1,
+    Column("id", Integer, primary_key=True),
+    Column("image_path", Text, nullable=False),
+    Column("phone_number", String, nullable=False),
+    Column("place_of_birth", String, nullable=False),
+    Column("motif", String, nullable=False),
+    Column("date", String, nullable=False),
+    Column("arrival_time", String, nullable=False),
+    Column("exit_time", String),
+    Column("observation", Text),
+)
+
+Table(
+    "visitor_shares", schema_v1,
+    Column("id", Integer, primary_key=True),
+    Column("visitor_id", Integer, ForeignKey("visitors.id", ondelete="CASCADE"), nullable=False),
+    Column("shared_by_user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("shared_with_user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("place_of_birth", String, nullable=False),
+    Column("phone_number", String, nullable=False),
+    Column("motif", Text),
+    Column("image_data", LargeBinary, nullable=False),
+    Column("shared_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    Column("status", String, server_default="active", nullable=False),
+    CheckConstraint("shared_by_user_id != shared_with_user_id", name="no_self_share"),
+    Index("idx_visitor_shares_visitor_id", "visitor_id"),
+    Index("idx_visitor_shares_user_id", "shared_with_user_id"),
+)
+
+Table(
+    "document_shares", schema_v1,
+    Column("id", Integer, primary_key=True),
+    Column("shared_by_user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("shared_to_user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("file", LargeBinary),
+    Column("file_name", String),
+    Column("document_type", String(50)),
+    Column("shared_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    Column("status", String, server_default="active", nullable=False),
+    CheckConstraint("shared_by_user_id != shared_to_user_id", name="no_self_share_doc"),
+    Index("idx_document_shares_user_id", "shared_to_user_id"),
+)
+
+Table(
+    "password_reset_tokens", schema_v1,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("token", String(64), unique=True, nullable=False),
+    Column("expires_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def _schema_initial(conn) -> None:
+    """Crée les tables absentes selon le schéma figé de la version 1 ; les tables existantes sont conservées."""
+    schema_v1.create_all(conn)
+
+
+def _colonnes_dates(conn) -> None:
+    """
+    Convertit les colonnes `visitors.date` / `visitors.arrival_time` (VARCHAR)
+    en vrais types DATE / TIME et crée l'index sur la date.
+    """
+    colonnes = {c["name"]: c["type"] for c in inspect(conn).get_columns("visitors")}
+
+    if conn.dialect.name == "postgresql":
+        if not isinstance(colonnes["date"], Date):
+            _creer_conversions_dates_pg(conn)
+            # Forme et valeur sont vérifiées : 2024-02-30 ou 25:61 comptent comme illisibles
+            illisibles = conn.execute(text(
+                "SELECT COUNT(*) FROM visitors "
+                "WHERE pg_temp.date_visiteur(date) IS NULL OR pg_temp.heure_visiteur(arrival_time) IS NULL"
+            )).scalar()
+            if illisibles:
+                logger.warning(
+                    f"{illisibles} visiteur(s) avec une date ou une heure illisible, "
+                    f"remplacée par {DATE_ILLISIBLE} / {HEURE_ILLISIBLE}."
+                )
+
+            conn.execute(text(r"""
+                ALTER TABLE visitors
+                    ALTER COLUMN date TYPE DATE USING COALESCE(pg_temp.date_visiteur(date), DATE '1970-01-01'),
+                    ALTER COLUMN date SET DEFAULT CURRENT_DATE,
+                    ALTER COLUMN arrival_time TYPE TIME USING COALESCE(pg_temp.heure_visiteur(arrival_time), TIME '00\:00'),
+                    ALTER COLUMN arrival_time SET DEFAULT LOCALTIME(0)
+            """))
+            conn.execute(text("DROP FUNCTION pg_temp.date_visiteur(text)"))
+            conn.execute(text("DROP FUNCTION pg_temp.heure_visiteur(text)"))
+    else:
+        # SQLite garde un typage dynamique : il suffit que chaque valeur soit
+        # au format ISO attendu par les types Date / Time.
+        _normaliser_dates_sqlite(conn)
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visitors_date ON visitors (date)"))
+
+
+def _creer_conversions_dates_pg(conn) -> None:
+    """
+    Fonctions temporaires de conversion des saisies libres (mêmes formats que
+    FORMATS_DATE / FORMATS_HEURE) : NULL si la valeur est illisible ou n'existe
+    pas, au lieu d'une erreur qui ferait échouer tout l'ALTER TABLE.
+    """
+    conn.execute(text(r"""
+        CREATE FUNCTION pg_temp.date_visiteur(valeur text) RETURNS date AS $$
+        DECLARE
+            p text[];
+        BEGIN
+            p := regexp_match(btrim(valeur), '^(\d{4})-(\d{1,2})-(\d{1,2})$');
+            IF p IS NOT NULL THEN
+                RETURN make_date(p[1]::int, p[2]::int, p[3]::int);
+            END IF;
+            p := regexp_match(btrim(valeur), '^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$');
+            IF p IS NOT NULL THEN
+                RETURN make_date(p[3]::int, p[2]::int, p[1]::int);
+            END IF;
+            RETURN NULL;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text(r"""
+        CREATE FUNCTION pg_temp.heure_visiteur(valeur text) RETURNS time AS $$
+        DECLARE
+            p text[];
+        BEGIN
+            p := regexp_match(btrim(valeur), '^(\d{1,2}):(\d{2})(?::(\d{2}))?$');
+            IF p IS NULL THEN
+                p := regexp_match(btrim(valeur), '^(\d{1,2})h(\d{2})?$');
+            END IF;
+            IF p IS NULL OR p[1]::int > 23 THEN
+                RETURN NULL;
+            END IF;
+            RETURN make_time(p[1]::int, coalesce(p[2], '0')::int, coalesce(p[3], '0')::int);
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+
+
+def _normaliser_dates_sqlite(conn) -> None:
+    """
+    Réécrit `visitors.date` en YYYY-MM-DD et `visitors.arrival_time` en HH:MM:SS
+    depuis les saisies libres (01/05/2024, 2024-5-1, 9:30, 9h30...). Les
+    valeurs illisibles sont remplacées par 1970-01-01 / 00:00:00.
+    """
+    corrections, illisibles = [], 0
+    for id_, date, heure in conn.execute(text("SELECT id, date, arrival_time FROM visitors")):
+        nouvelle_date = _normaliser(date, FORMATS_DATE, "%Y-%m-%d")
+        nouvelle_heure = _normaliser(heure, FORMATS_HEURE, "%H:%M:%S")
+        if nouvelle_date is None or nouvelle_heure is None:
+            illisibles += 1
+        nouvelle_date = nouvelle_date or DATE_ILLISIBLE
+        nouvelle_heure = nouvelle_heure or HEURE_ILLISIBLE
+        if (nouvelle_date, nouvelle_heure) != (date, heure):
+            corrections.append({"id": id_, "date": nouvelle_date, "heure": nouvelle_heure})
+
+    if corrections:
+        conn.execute(text("UPDATE visitors SET date = :date, arrival_time = :heure WHERE id = :id"), corrections)
+    if illisibles:
+        logger.warning(
+            f"{illisibles} visiteur(s) avec une date ou une heure illisible, "
+            f"remplacée par {DATE_ILLISIBLE} / {HEURE_ILLISIBLE}."
+        )
+
+
+def _normaliser(valeur, formats: tuple[str, ...], sortie: str) -> str | None:
+    """Valeur reformatée selon `sortie`, ou None si aucun des formats ne la lit."""
+    if valeur is None:
+        return None
+    texte = str(valeur).strip()
+    for format_ in formats:
+        try:
+            return datetime.strptime(texte, format_).strftime(sortie)
+        except ValueError:
+            continue
+    return None
+
+
+def _index_recherche(conn) -> None:
+    """
+    Prépare la recherche plein texte sur les visiteurs.
+    - PostgreSQL : extension pg_trgm et index GIN trigrammes, utilisés par ILIKE '%...%'.
+    - SQLite : table virtuelle FTS5 (tokenizer trigram) synchronisée par triggers.
+    Si l'index ne peut pas être créé, la recherche reste possible sans index.
+    """
+    if conn.dialect.name == "postgresql":
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for colonne in COLONNES_RECHERCHE:
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS idx_visitors_{colonne}_trgm "
+                        f"ON visitors USING gin ({colonne} gin_trgm_ops)"
+                    ))
+        except Exception as e:
+            logger.warning(f"Index trigrammes non créés (droits sur pg_trgm ?), la recherche sera non indexée : {e}")
+        return
+
+    if conn.dialect.name != "sqlite" or sqlite3.sqlite_version_info < (3, 34, 0):
+        logger.warning("Index de recherche indisponible sur cette base, la recherche utilisera LIKE.")
+        return
+
+    if inspect(conn).has_table("visitors_fts"):
+        return
+
+    try:
+        with conn.begin_nested():
+            _creer_fts_sqlite(conn)
+    except Exception as e:
+        logger.warning(f"FTS5 indisponible, la recherche utilisera LIKE : {e}")
+
+
+def _creer_fts_sqlite(conn) -> None:
+    colonnes = ", ".join(COLONNES_RECHERCHE)
+    nouvelles = ", ".join(f"new.{c}" for c in COLONNES_RECHERCHE)
+    anciennes = ", ".join(f"old.{c}" for c in COLONNES_RECHERCHE)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE visitors_fts USING fts5({colonnes}, "
+        "content='visitors', content_rowid='id', tokenize='trigram')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER visitors_fts_ai AFTER INSERT ON visitors BEGIN "
+        f"INSERT INTO visitors_fts(rowid, {colonnes}) VALUES (new.id, {nouvelles}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER visitors_fts_ad AFTER DELETE ON visitors BEGIN "
+        f"INSERT INTO visitors_fts(visitors_fts, rowid, {colonnes}) VALUES ('delete', old.id, {anciennes}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER visitors_fts_au AFTER UPDATE ON visitors BEGIN "
+        f"INSERT INTO visitors_fts(visitors_fts, rowid, {colonnes}) VALUES ('delete', old.id, {anciennes}); "
+        f"INSERT INTO visitors_fts(rowid, {colonnes}) VALUES (new.id, {nouvelles}); END"
+    ))
+    conn.execute(text("INSERT INTO visitors_fts(visitors_fts) VALUES ('rebuild')"))
+
+
+# (table, colonne, table référencée) : clés étrangères déclarées par init_db.sql
+CLES_ETRANGERES_PARTAGES = (
+    ("visitor_shares", "visitor_id", "visitors"),
+    ("visitor_shares", "shared_by_user_id", "users"),
+    ("visitor_shares", "shared_with_user_id", "users"),
+    ("document_shares", "shared_by_user_id", "users"),
+    ("document_shares", "shared_to_user_id", "users"),
+)
+
+
+def _cles_etrangeres_partages(conn) -> None:
+    """
+    Aligne les bases créées par les modèles sur init_db.sql : clés étrangères
+    des tables de partage et noms d'index idx_*.
+    """
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visitor_shares_visitor_id ON visitor_shares (visitor_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visitor_shares_user_id ON visitor_shares (shared_with_user_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_document_shares_user_id ON document_shares (shared_to_user_id)"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_visitor_shares_visitor_id"))
+
+    if conn.dialect.name != "postgresql":
+        # SQLite ne sait pas ajouter une contrainte à une table existante
+        return
+
+    inspector = inspect(conn)
+    for table, colonne, cible in CLES_ETRANGERES_PARTAGES:
+        existantes = {
+            tuple(fk["constrained_columns"]): fk for fk in inspector.get_foreign_keys(table)
+        }
+        fk = existantes.get((colonne,))
+        if fk and fk.get("options", {}).get("ondelete", "").upper() == "CASCADE":
+            continue
+        if fk and fk.get("name"):
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{fk["name"]}"'))
+        # NOT VALID : les lignes orphelines existantes sont conservées, les nouvelles sont contrôlées
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_{colonne}_fkey "
+            f"FOREIGN KEY ({colonne}) REFERENCES {cible}(id) ON DELETE CASCADE NOT VALID"
+        ))
+
+
+def _notifications_partages(conn) -> None:
+    """
+    PostgreSQL : chaque nouveau partage actif publie un NOTIFY sur le canal
+    de son destinataire (partages_<user_id>), écouté par managers.notifications.
+    Les autres bases restent sur la vérification périodique.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION notifier_partage() RETURNS trigger AS $$
+        DECLARE
+            destinataire integer;
+            type_partage text;
+        BEGIN
+            IF TG_TABLE_NAME = 'visitor_shares' THEN
+                destinataire := NEW.shared_with_user_id;
+                type_partage := 'visiteur';
+            ELSE
+                destinataire := NEW.shared_to_user_id;
+                type_partage := 'document';
+            END IF;
+            PERFORM pg_notify(
+                'partages_' || destinataire,
+                json_build_object('type', type_partage, 'id', NEW.id)::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    for table in ("visitor_shares", "document_shares"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_notify ON {table}"))
+        conn.execute(text(
+            f"CREATE TRIGGER {table}_notify AFTER INSERT ON {table} "
+            f"FOR EACH ROW WHEN (NEW.status = 'active') EXECUTE FUNCTION notifier_partage()"
+        ))
+
+
+def _index_partages_incrementaux(conn) -> None:
+    """
+    Index (destinataire, id) pour ne lire que les partages plus récents que
+    le dernier repère. Ils couvrent aussi les anciens index sur le seul destinataire.
+    """
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_visitor_shares_user_id_id ON visitor_shares (shared_with_user_id, id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_document_shares_user_id_id ON document_shares (shared_to_user_id, id)"
+    ))
+    conn.execute(text("DROP INDEX IF EXISTS idx_visitor_shares_user_id"))
+    conn.execute(text("DROP INDEX IF EXISTS idx_document_shares_user_id"))
+
+
+def _morceaux_documents(conn) -> None:
+    """
+    Stockage des documents par morceaux (document_chunks) et taille du fichier
+    sur document_shares. Les documents existants restent lisibles depuis `file`.
+    La table est remplacée par blob_chunks à la migration 8.
+    """
+    binaire = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS document_chunks (
+            document_id INTEGER NOT NULL REFERENCES document_shares(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            data {binaire} NOT NULL,
+            PRIMARY KEY (document_id, seq)
+        )
+    """))
+
+    colonnes = {c["name"] for c in inspect(conn).get_columns("document_shares")}
+    if "file_size" not in colonnes:
+        conn.execute(text("ALTER TABLE document_shares ADD COLUMN file_size BIGINT"))
+
+    if conn.dialect.name == "postgresql":
+        # Morceaux déjà compressés ou binaires : pas de recompression TOAST
+        conn.execute(text("ALTER TABLE document_chunks ALTER COLUMN data SET STORAGE EXTERNAL"))
+
+
+def _blobs_partages(conn) -> None:
+    """
+    Contenus partagés dédupliqués par empreinte SHA-256 (blobs, blob_chunks).
+    - colonne blob_hash sur les deux tables de partage ;
+    - visitor_shares.image_data devient facultative (SQLite : table reconstruite) ;
+    - les morceaux de document_chunks sont déplacés vers blob_chunks, puis la table est supprimée.
+    Les contenus stockés directement dans `file` / `image_data` restent lus tels quels.
+    """
+    binaire = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash VARCHAR(64) PRIMARY KEY,
+            size BIGINT NOT NULL,
+            ref_count INTEGER DEFAULT 1 NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS blob_chunks (
+            blob_hash VARCHAR(64) NOT NULL REFERENCES blobs(hash) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            data {binaire} NOT NULL,
+            PRIMARY KEY (blob_hash, seq)
+        )
+    """))
+
+    inspector = inspect(conn)
+    for table in ("visitor_shares", "document_shares"):
+        if "blob_hash" not in {c["name"] for c in inspector.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN blob_hash VARCHAR(64) REFERENCES blobs(hash)"))
+
+    image_data = next(c for c in inspect(conn).get_columns("visitor_shares") if c["name"] == "image_data")
+    if not image_data["nullable"]:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE visitor_shares ALTER COLUMN image_data DROP NOT NULL"))
+        else:
+            _reconstruire_sqlite(conn, "visitor_shares")
+
+    if inspect(conn).has_table("document_chunks"):
+        _deplacer_morceaux_documents(conn)
+        conn.execute(text("DROP TABLE document_chunks"))
+
+    if conn.dialect.name == "postgresql":
+        # Morceaux déjà compressés ou binaires : pas de recompression TOAST
+        conn.execute(text("ALTER TABLE blob_chunks ALTER COLUMN data SET STORAGE EXTERNAL"))
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_visitor_shares_blob_hash ON visitor_shares (blob_hash)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_document_shares_blob_hash ON document_shares (blob_hash)"))
+
+
+def _reconstruire_sqlite(conn, table: str) -> None:
+    """
+    SQLite ne sait pas modifier une colonne : la table est recréée depuis son
+    modèle et les colonnes communes recopiées. La table obtenue suit le modèle
+    courant : les migrations suivantes doivent vérifier l'existence des
+    colonnes qu'elles ajoutent.
+    """
+    inspector = inspect(conn)
+    anciennes = {c["name"] for c in inspector.get_columns(table)}
+    for index in inspector.get_indexes(table):
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_ancienne"))
+
+    modele = Base.metadata.tables[table]
+    modele.create(conn)
+    colonnes = ", ".join(c.name for c in modele.columns if c.name in anciennes)
+    conn.execute(text(f"INSERT INTO {table} ({colonnes}) SELECT {colonnes} FROM {table}_ancienne"))
+    conn.execute(text(f"DROP TABLE {table}_ancienne"))
+
+
+def _deplacer_morceaux_documents(conn) -> None:
+    """Rattache chaque document découpé en morceaux à un blob, partagé entre documents identiques."""
+    documents = conn.execute(text(
+        "SELECT DISTINCT document_id FROM document_chunks ORDER BY document_id"
+    )).scalars().all()
+
+    for document_id in documents:
+        empreinte, taille = hashlib.sha256(), 0
+        morceaux = conn.execute(
+            text("SELECT data FROM document_chunks WHERE document_id = :id ORDER BY seq"),
+            {"id": document_id},
+            execution_options={"yield_per": 4},
+        )
+        for (morceau,) in morceaux:
+            empreinte.update(morceau)
+            taille += len(morceau)
+        cle = empreinte.hexdigest()
+
+        existe = conn.execute(
+            text("UPDATE blobs SET ref_count = ref_count + 1 WHERE hash = :cle"), {"cle": cle}
+        ).rowcount
+        if not existe:
+            conn.execute(
+                text("INSERT INTO blobs (hash, size, ref_count) VALUES (:cle, :taille, 1)"),
+                {"cle": cle, "taille": taille},
+            )
+            conn.execute(text(
+                "INSERT INTO blob_chunks (blob_hash, seq, data) "
+                "SELECT :cle, seq, data FROM document_chunks WHERE document_id = :id"
+            ), {"cle": cle, "id": document_id})
+        conn.execute(
+            text("UPDATE document_shares SET blob_hash = :cle WHERE id = :id"), {"cle": cle, "id": document_id}
+        )
+
+
+def _compression_blobs(conn) -> None:
+    """Codec de compression des blobs ; les contenus existants sont stockés bruts."""
+    if "codec" not in {c["name"] for c in inspect(conn).get_columns("blobs")}:
+        conn.execute(text("ALTER TABLE blobs ADD COLUMN codec VARCHAR(8) DEFAULT 'raw' NOT NULL"))
+
+
+def _recompter_references_blobs(conn) -> None:
+    """
+    Recalcule blobs.ref_count d'après les partages qui pointent réellement vers
+    chaque contenu, puis supprime les contenus orphelins : les partages emportés
+    par ON DELETE CASCADE (visiteur ou utilisateur supprimé) ne libéraient pas
+    leur référence.
+    """
+    conn.execute(text("""
+        UPDATE blobs SET ref_count =
+            (SELECT COUNT(*) FROM visitor_shares WHERE visitor_shares.blob_hash = blobs.hash)
+            + (SELECT COUNT(*) FROM document_shares WHERE document_shares.blob_hash = blobs.hash)
+    """))
+    conn.execute(text(
+        "DELETE FROM blob_chunks WHERE blob_hash IN (SELECT hash FROM blobs WHERE ref_count <= 0)"
+    ))
+    conn.execute(text("DELETE FROM blobs WHERE ref_count <= 0"))
+
+
+def _dates_visiteurs_sqlite(conn) -> None:
+    """
+    SQLite : normalise les dates et heures laissées hors format ISO par les
+    premières versions de la migration 2, illisibles pour les types Date / Time.
+    """
+    if conn.dialect.name == "sqlite":
+        _normaliser_dates_sqlite(conn)
+
+
+MIGRATIONS = (
+    (1, "Schéma initial", _schema_initial),
+    (2, "Colonnes date et heure natives sur visitors", _colonnes_dates),
+    (3, "Index de recherche sur visitors", _index_recherche),
+    (4, "Clés étrangères et index des tables de partage", _cles_etrangeres_partages),
+    (5, "Notifications des nouveaux partages (PostgreSQL)", _notifications_partages),
+    (6, "Index incrémentaux des partages reçus", _index_partages_incrementaux),
+    (7, "Stockage des documents par morceaux", _morceaux_documents),
+    (8, "Contenus partagés dédupliqués par empreinte", _blobs_partages),
+    (9, "Compression des contenus partagés", _compression_blobs),
+    (10, "Recalcul des références des contenus partagés", _recompter_references_blobs),
+    (11, "Normalisation des dates et heures des visiteurs (SQLite)", _dates_visiteurs_sqlite),
+)
+
+VERSION_SCHEMA = MIGRATIONS[-1][0]
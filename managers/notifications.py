@@ -0,0 +1,110 @@
+import json
+import select
+import sys
+import threading
+from helpers import setup_logger
+
+logger = setup_logger()
+
+# Canal NOTIFY d'un destinataire, alimenté par les triggers de la migration 5
+CANAL_PARTAGES = "partages_{user_id}"
+# Délai maximal d'attente d'une notification avant de revérifier la demande d'arrêt (secondes)
+ATTENTE_MAX = 5.0
+# Délais entre deux tentatives de reconnexion, doublés à chaque échec (secondes)
+RECONNEXION_MIN = 1.0
+RECONNEXION_MAX = 60.0
+
+
+def push_disponible(engine) -> bool:
+    """Les notifications push demandent PostgreSQL avec le pilote psycopg2."""
+    return engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+
+
+class ShareListener(threading.Thread):
+    """
+    Écoute les partages reçus par un utilisateur via LISTEN/NOTIFY.
+
+    `callback(evenement)` est appelé depuis le thread d'écoute :
+    - avec le contenu de la notification, ex : {"type": "visiteur", "id": 12} ;
+    - avec None après chaque (re)connexion, car des partages ont pu arriver
+      pendant la coupure : l'appelant doit alors faire une vérification complète.
+
+    La connexion d'écoute est dédiée et détachée du pool. Elle est rouverte
+    automatiquement en cas de coupure.
+    """
+
+    def __init__(self, engine, user_id: int, callback):
+        super().__init__(name=f"ShareListener-{user_id}", daemon=True)
+        self.engine = engine
+        self.canal = CANAL_PARTAGES.format(user_id=int(user_id))
+        self.callback = callback
+        self._arret = threading.Event()
+        self._delai = RECONNEXION_MIN
+
+    def stop(self) -> None:
+        """Demande l'arrêt, effectif au plus tard après ATTENTE_MAX secondes."""
+        self._arret.set()
+
+    def run(self) -> None:
+        while not self._arret.is_set():
+            try:
+                self._ecouter()
+            except Exception as e:
+                logger.error(f"L'erreur suivante vient de se produire {e}")
+                logger.warning(f"Écoute des partages interrompue, nouvelle tentative dans {self._delai:.0f} s.")
+                self._arret.wait(self._delai)
+                self._delai = min(self._delai * 2, RECONNEXION_MAX)
+
+    def _ecouter(self) -> None:
+        connexion = self.engine.raw_connection()
+        # Connexion réservée à l'écoute : elle ne doit jamais retourner dans le pool
+        connexion.detach()
+        try:
+            dbapi = connexion.driver_connection
+            dbapi.rollback()
+            dbapi.autocommit = True
+            with dbapi.cursor() as cur:
+                cur.execute(f'LISTEN "{self.canal}"')
+
+            self._delai = RECONNEXION_MIN
+            self._notifier(None)
+
+            while not self._arret.is_set():
+                if select.select([dbapi], [], [], ATTENTE_MAX) == ([], [], []):
+                    continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    self._notifier(self._decoder(dbapi.notifies.pop(0).payload))
+        finally:
+            connexion.close()
+
+    @staticmethod
+    def _decoder(payload: str) -> dict:
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return {"type": None}
+
+    def _notifier(self, evenement: dict | None) -> None:
+        try:
+            self.callback(evenement)
+        except Exception as e:
+            logger.error(f"L'erreur suivante vient de se produire {e}")
+
+
+if __name__ == "__main__":
+    # Vérification manuelle contre un PostgreSQL local :
+    #   GESTION_DB_URL=postgresql://... python -m managers.notifications <user_id>
+    # puis insérer un partage destiné à cet utilisateur depuis un autre poste ou psql.
+    from managers.database import get_database
+
+    engine = get_database().engine
+    if not push_disponible(engine):
+        sys.exit("Notifications push indisponibles : PostgreSQL avec psycopg2 requis.")
+
+    ecouteur = ShareListener(engine, int(sys.argv[1]), lambda evenement: print(evenement, flush=True))
+    ecouteur.start()
+    try:
+        ecouteur.join()
+    except KeyboardInterrupt:
+        ecouteur.stop()
@@ -1,17 +1,50 @@
-from models import Visitor, VisitorShare
-from managers.user_manager import UserManager
+from models import Visitor, VisitorShare, DocumentShare, User, ShareInboxItem
+from managers.blob_store import BlobStore
+from managers.database import Database, get_database
+from managers.migrations import COLONNES_RECHERCHE
 from helpers import setup_logger
-from datetime import datetime
-import json
+from datetime import datetime, date, timedelta
+from sqlalchemy import extract, func, insert, inspect, literal, or_, select, text, union_all
+from sqlalchemy.orm import undefer
+from helpers import WatermarkStore
+from helpers.streaming import detecter_format, ecrire_records, iter_records, ouvrir_texte
+import time
 from typing import Optional, Tuple, List
 import os
 
 logger = setup_logger()
 
-# db n'existe plus en tant qu'objet global, on utilise UserManager pour la session
+# Nombre de visiteurs chargés par page sur l'écran principal
+TAILLE_PAGE = 60
+
+# Nombre de lignes insérées par transaction lors d'un import
+TAILLE_LOT_IMPORT = 1000
+# Nombre maximal d'erreurs détaillées conservées dans le rapport d'import
+MAX_ERREURS_IMPORT = 1000
+# Nombre de lignes lues par aller-retour lors d'un export
+TAILLE_LOT_EXPORT = 1000
+# Colonnes exportées, dans l'ordre des fichiers CSV
+COLONNES_EXPORT = [
+    "id", "image_path", "phone_number", "place_of_birth", "motif",
+    "date", "arrival_time", "exit_time", "observation",
+]
+# Marqueur du dernier visiteur exporté (export incrémental)
+CLE_EXPORT = "export_visiteurs"
+
+# db n'existe plus en tant qu'objet global, la session vient de la base partagée (managers.database)
 class VisitorManager:
-    def __init__(self):
-        self.session = UserManager().Session()
+    def __init__(self, database: Database | None = None):
+        # Registre de sessions partagé : une session par thread, même engine pour tous les managers
+        database = database or get_database()
+        self.Session = database.Session
+        self.blobs = BlobStore(database.engine)
+        self._fts_sqlite = None
+        self.watermarks = WatermarkStore()
+
+    @property
+    def session(self):
+        """Session du thread courant (scoped_session)."""
+        return self.Session()
     
     """ 
     Méthodes pour gérer les visiteurs dans la base de données.
@@ -29,6 +62,8 @@ class VisitorManager:
             )
             session.add(visiteur)
             session.commit()
+            # Recharge les valeurs par défaut (id, date, heure) avant la fermeture de la session
+            session.refresh(visiteur)
             return visiteur, None
         except Exception as e:
             return self.add_error_logger(
@@ -55,7 +90,89 @@ class VisitorManager:
             return session.query(Visitor).order_by(Visitor.id).all()
         finally:
             session.close()
+
+    def lister_visiteurs_page(
+        self,
+        apres_id: Optional[int] = None,
+        limite: int = TAILLE_PAGE,
+        annee: Optional[int] = None,
+        mois: Optional[int] = None,
+        jour: Optional[int] = None,
+        recherche: Optional[str] = None,
+    ) -> Tuple[List[Visitor], Optional[int]]:
+        """
+        Retourne une page de visiteurs triés par identifiant et le curseur de la page suivante.
+        La pagination se fait par clé (id > curseur) et non par OFFSET : le coût
+        d'une page ne dépend ni de sa position ni de la taille de la table.
+        :param apres_id: curseur renvoyé par l'appel précédent (None pour la première page)
+        :param annee, mois, jour: filtre optionnel sur la date de visite, évalué par la base
+        :param recherche: texte cherché dans le téléphone, le lieu de naissance, le motif et l'observation
+        :return: tuple (visiteurs, curseur), le curseur vaut None sur la dernière page
+        """
+        session = self.session
+        try:
+            query = session.query(Visitor).filter(*self._filtre_date(annee, mois, jour)).order_by(Visitor.id)
+            if recherche:
+                query = query.filter(self._filtre_recherche(recherche, session))
+            if apres_id is not None:
+                query = query.filter(Visitor.id > apres_id)
+            # Une ligne de plus pour savoir s'il reste une page sans COUNT(*)
+            visiteurs = query.limit(limite + 1).all()
+            if len(visiteurs) > limite:
+                return visiteurs[:limite], visiteurs[limite - 1].id
+            return visiteurs, None
+        finally:
+            session.close()
     
+    @staticmethod
+    def _filtre_date(annee: Optional[int], mois: Optional[int], jour: Optional[int]) -> list:
+        """
+        Traduit le filtre année/mois/jour en conditions SQL.
+        Dès que l'année est connue, le filtre devient un intervalle [début, fin[
+        sur `Visitor.date`, servi par l'index idx_visitors_date.
+        Lève ValueError si la date demandée n'existe pas (ex : 31/02).
+        """
+        conditions = []
+        if annee:
+            if mois and jour:
+                debut = date(annee, mois, jour)
+                fin = debut + timedelta(days=1)
+            elif mois:
+                debut = date(annee, mois, 1)
+                fin = date(annee + 1, 1, 1) if mois == 12 else date(annee, mois + 1, 1)
+            else:
+                debut = date(annee, 1, 1)
+                fin = date(annee + 1, 1, 1)
+                if jour:
+                    conditions.append(extract("day", Visitor.date) == jour)
+            conditions += [Visitor.date >= debut, Visitor.date < fin]
+        else:
+            if mois:
+                conditions.append(extract("month", Visitor.date) == mois)
+            if jour:
+                conditions.append(extract("day", Visitor.date) == jour)
+        return conditions
+
+    def _filtre_recherche(self, recherche: str, session):
+        """
+        Construit la condition de recherche (préfixe ou sous-chaîne).
+        PostgreSQL : ILIKE servi par les index GIN pg_trgm.
+        SQLite : MATCH sur la table FTS5 trigram, LIKE pour moins de 3 caractères.
+        """
+        bind = session.get_bind()
+        if bind.dialect.name == "sqlite" and len(recherche) >= 3:
+            if self._fts_sqlite is None:
+                self._fts_sqlite = inspect(bind).has_table("visitors_fts")
+            if self._fts_sqlite:
+                phrase = '"' + recherche.replace('"', '""') + '"'
+                return Visitor.id.in_(
+                    select(text("rowid")).select_from(text("visitors_fts"))
+                    .where(text("visitors_fts MATCH :phrase").bindparams(phrase=phrase))
+                )
+
+        pattern = "%" + recherche.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return or_(*(getattr(Visitor, c).ilike(pattern, escape="\\") for c in COLONNES_RECHERCHE))
+
     def mettre_a_jour_visiteur(self, visitor_id, **kwargs):
         """Met à jour les informations d'un visiteur."""
         session = self.session
@@ -88,6 +205,8 @@ class VisitorManager:
             visiteur = session.get(Visitor, visitor_id)
             if not visiteur:
                 return False, "Visiteur non trouvé."
+            # Les partages du visiteur disparaissent avec lui : leurs images sont libérées
+            self.blobs.supprimer_partages(session, VisitorShare, VisitorShare.visitor_id == visitor_id)
             session.delete(visiteur)
             session.commit()
             return True, None
@@ -110,29 +229,143 @@ class VisitorManager:
     Méthodes pour l'import/export des visiteurs.
     """
     
-    def exporter_visiteurs(self, chemin_fichier):
-        """Exporte tous les visiteurs dans un fichier JSON."""
-        visiteurs = self.lister_visiteurs()
-        with open(chemin_fichier, "w", encoding="utf-8") as f:
-            json.dump([v.to_dict() for v in visiteurs], f, ensure_ascii=False, indent=4)
-            
-    def importer_visiteurs(self, chemin_fichier):
-        """Importe des visiteurs depuis un fichier JSON et les ajoute à la base."""
-        with open(chemin_fichier, "r", encoding="utf-8") as f:
-            visiteurs = json.load(f)
-        for v in visiteurs:
-            self.ajouter_visiteur(
-                v.get("image_path", ""),
-                v.get("phone_number", ""),
-                v.get("motif", "")
+    def exporter_visiteurs(self, chemin_fichier, format: Optional[str] = None,
+                           compression: Optional[str] = None, depuis_dernier_export: bool = False) -> int:
+        """
+        Exporte les visiteurs en flux vers un fichier JSON (tableau), NDJSON ou CSV.
+        Les lignes sont lues par lots via un curseur côté serveur (yield_per) et
+        écrites au fur et à mesure : la mémoire utilisée ne dépend pas de la taille du registre.
+        :param format: "json", "ndjson" ou "csv" ; déduit de l'extension par défaut
+        :param compression: None, "gzip" ou "zstd" ; déduite de l'extension (.gz, .zst) par défaut
+        :param depuis_dernier_export: n'exporte que les visiteurs ajoutés depuis le dernier
+                                      export incrémental (identifiant supérieur au marqueur)
+        :return: le nombre de visiteurs exportés
+        """
+        format = detecter_format(chemin_fichier, format)
+        dernier_id = self.watermarks.get(CLE_EXPORT, 0) if depuis_dernier_export else 0
+        exporte = {"dernier_id": dernier_id}
+
+        def lignes(query):
+            for visiteur in query:
+                exporte["dernier_id"] = visiteur.id
+                yield visiteur.to_dict()
+
+        session = self.session
+        try:
+            query = (
+                session.query(Visitor)
+                .filter(Visitor.id > dernier_id)
+                .order_by(Visitor.id)
+                .yield_per(TAILLE_LOT_EXPORT)
             )
+            with ouvrir_texte(chemin_fichier, "w", compression) as f:
+                nombre = ecrire_records(f, format, lignes(query), COLONNES_EXPORT)
+        finally:
+            session.close()
+
+        if depuis_dernier_export:
+            self.watermarks.set(CLE_EXPORT, exporte["dernier_id"])
+        logger.info(f"Export de {nombre} visiteurs vers {chemin_fichier}.")
+        return nombre
+            
+    def importer_visiteurs(self, chemin_fichier, format: Optional[str] = None,
+                           taille_lot: int = TAILLE_LOT_IMPORT, progression=None) -> dict:
+        """
+        Importe des visiteurs depuis un fichier JSON (tableau), NDJSON ou CSV.
+        Le fichier est lu en flux, chaque ligne est validée puis les lignes
+        valides sont insérées par lots (INSERT multi-lignes, un commit par lot).
+        Si un lot est refusé par la base, ses lignes sont réessayées une à une
+        pour isoler les fautives.
+        :param format: "json", "ndjson" ou "csv" ; déduit de l'extension par défaut
+                       (fichiers .gz et .zst acceptés)
+        :param progression: fonction optionnelle appelée avec le nombre de lignes importées
+        :return: dict avec "importes", "erreurs" [(ligne, message)], "duree" (s) et "lignes_par_seconde"
+        """
+        format = detecter_format(chemin_fichier, format)
+        rapport = {"importes": 0, "erreurs": [], "duree": 0.0, "lignes_par_seconde": 0.0}
+        debut = time.perf_counter()
+        lot = []
+
+        with ouvrir_texte(chemin_fichier, "r") as f:
+            try:
+                for numero, enregistrement in iter_records(f, format):
+                    try:
+                        lot.append((numero, self._valider_import(enregistrement)))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        self._erreur_import(rapport, numero, e)
+                    if len(lot) >= taille_lot:
+                        self._inserer_lot(lot, rapport, progression)
+                        lot = []
+            except ValueError as e:
+                # Fichier illisible au-delà de ce point : on garde ce qui a été lu
+                self._erreur_import(rapport, None, e)
+        if lot:
+            self._inserer_lot(lot, rapport, progression)
+
+        rapport["duree"] = time.perf_counter() - debut
+        if rapport["duree"] > 0:
+            rapport["lignes_par_seconde"] = rapport["importes"] / rapport["duree"]
+        logger.info(
+            f"Import de {chemin_fichier} : {rapport['importes']} visiteurs en {rapport['duree']:.1f}s "
+            f"({rapport['lignes_par_seconde']:.0f} lignes/s), {len(rapport['erreurs'])} erreur(s)."
+        )
+        return rapport
+
+    @staticmethod
+    def _valider_import(enregistrement: dict) -> dict:
+        """Vérifie un enregistrement importé et le convertit en valeurs de colonnes."""
+        ligne = {}
+        for champ in ("phone_number", "place_of_birth", "motif"):
+            valeur = str(enregistrement.get(champ) or "").strip()
+            if not valeur:
+                raise ValueError(f"Champ obligatoire manquant : {champ}")
+            ligne[champ] = valeur
+
+        ligne["image_path"] = str(enregistrement.get("image_path") or "")
+        valeur_date = enregistrement.get("date")
+        ligne["date"] = date.fromisoformat(valeur_date) if valeur_date else datetime.now().date()
+        valeur_heure = enregistrement.get("arrival_time")
+        ligne["arrival_time"] = (
+            datetime.strptime(valeur_heure[:5], "%H:%M").time() if valeur_heure
+            else datetime.now().time().replace(second=0, microsecond=0)
+        )
+        ligne["exit_time"] = enregistrement.get("exit_time") or None
+        ligne["observation"] = enregistrement.get("observation") or None
+        return ligne
+
+    def _inserer_lot(self, lot: list, rapport: dict, progression) -> None:
+        session = self.session
+        try:
+            session.execute(insert(Visitor), [ligne for _, ligne in lot])
+            session.commit()
+            rapport["importes"] += len(lot)
+        except Exception:
+            session.rollback()
+            for numero, ligne in lot:
+                try:
+                    session.execute(insert(Visitor), [ligne])
+                    session.commit()
+                    rapport["importes"] += 1
+                except Exception as e:
+                    session.rollback()
+                    self._erreur_import(rapport, numero, e)
+        finally:
+            session.close()
+
+        if progression:
+            progression(rapport["importes"])
+
+    @staticmethod
+    def _erreur_import(rapport: dict, numero, erreur) -> None:
+        if len(rapport["erreurs"]) < MAX_ERREURS_IMPORT:
+            rapport["erreurs"].append((numero, str(erreur)))
     
     """
     Méthodes pour gérer le partage des visiteurs.
     """
 
     def accept_share(self, share_id):
-        """Accepte un partage et ajoute le visiteur à la liste."""
+        """Accepte un partage et ajoute le visiteur à la liste. Retourne le Visitor créé ou False."""
         session = self.session
         try:
             return self.save_visitor(share_id, session)
@@ -143,7 +376,7 @@ class VisitorManager:
             session.close()
 
     def save_visitor(self, share_id, session):
-        share = self.session.get(VisitorShare, share_id)
+        share = session.get(VisitorShare, share_id, options=[undefer(VisitorShare.image_data)])
         if not share or share.status != "active":
             return False
 
@@ -161,13 +394,19 @@ class VisitorManager:
             place_of_birth=share.place_of_birth,
             motif=share.motif,
         )
-        # Sauvegarder l'image sur disque
+        # Sauvegarder l'image sur disque (partages d'avant la table blobs : image_data)
         with open(visitor.image_path, "wb") as f:
-            f.write(share.image_data)
+            if share.blob_hash is not None:
+                for morceau in self.blobs.iter_blob(share.blob_hash):
+                    f.write(morceau)
+            else:
+                f.write(share.image_data)
 
         session.add(visitor)
 
-        return self.change_share_statut("accepted", share, session)
+        self.change_share_statut("accepted", share, session)
+        session.refresh(visitor)
+        return visitor
 
     def check_access(self, visitor_id, user_id):
         """Vérifie si un partage actif existe pour cet utilisateur."""
@@ -184,32 +423,66 @@ class VisitorManager:
         finally:
             session.close()
     
-    def edit_share_status(self, share: VisitorShare):
+    def get_inbox_for_user(self, user_id: int, statuts: tuple | None = None, apres_id: int = 0) -> List[ShareInboxItem]:
         """
-        Met à jour le statut d'un partage en notified
+        Boîte de réception des visiteurs partagés, en une seule requête :
+        expéditeur joint, sans la photo, triée par date de partage.
 
         Args:
-            share : Est un objet VisitorShare
+            user_id : destinataire des partages
+            statuts : statuts retenus, tous sauf "revoked" par défaut
+            apres_id : ne retourne que les partages d'identifiant supérieur (repère)
         """
+        requete = (
+            select(
+                VisitorShare.id, VisitorShare.shared_by_user_id, User.nom, User.prenom,
+                VisitorShare.shared_at, VisitorShare.status,
+            )
+            .join(VisitorShare.shared_by)
+            .where(VisitorShare.shared_with_user_id == user_id)
+            .order_by(VisitorShare.shared_at, VisitorShare.id)
+        )
+        if apres_id:
+            requete = requete.where(VisitorShare.id > apres_id)
+        if statuts is None:
+            requete = requete.where(VisitorShare.status != "revoked")
+        else:
+            requete = requete.where(VisitorShare.status.in_(statuts))
+
         session = self.session
         try:
-            share.status = "notified"
-            session.commit()
+            return [
+                ShareInboxItem(
+                    id=ligne.id, type="visiteur", shared_by_user_id=ligne.shared_by_user_id,
+                    expediteur_nom=ligne.nom, expediteur_prenom=ligne.prenom,
+                    shared_at=ligne.shared_at, status=ligne.status,
+                )
+                for ligne in session.execute(requete)
+            ]
         finally:
             session.close()
-          
-    def get_active_shares_for_user(self, user_id):
-        """Liste les partages reçus par un utilisateur."""
+
+    def compter_partages_recus(self, user_id: int) -> dict:
+        """
+        Nombre de partages reçus pour les badges, en une seule requête COUNT
+        sur les deux tables, sans lire aucune colonne binaire :
+        visiteurs encore actifs et documents non révoqués.
+
+        Returns:
+            dict : {"visiteur": n, "document": m}
+        """
+        requete = union_all(
+            select(literal("visiteur").label("type"), func.count().label("nombre"))
+            .where(VisitorShare.shared_with_user_id == user_id, VisitorShare.status == "active"),
+            select(literal("document").label("type"), func.count().label("nombre"))
+            .where(DocumentShare.shared_to_user_id == user_id, DocumentShare.status != "revoked"),
+        )
         session = self.session
         try:
-            return (
-                session.query(VisitorShare)
-                .filter_by(shared_with_user_id=user_id, status="active")
-                .all()
-            )
+            return {ligne.type: ligne.nombre for ligne in session.execute(requete)}
         finally:
             session.close()
-    
+
     def get_shares_for_user(self, user_id):
         return (
             self.session.query(VisitorShare)
@@ -233,29 +506,57 @@ class VisitorManager:
 
     def change_share_statut(self, arg0, share, session):
         share.status = arg0
+        # Image copiée chez le destinataire ou partage révoqué : la référence est libérée
+        if arg0 in ("accepted", "revoked"):
+            self.blobs.detacher(session, share)
         session.commit()
         return True
             
     def share_visitor(self, visitor, shared_by_id, shared_with_id, motif=None):
         """Crée un partage en copiant les données du visitor."""
+        if shared_with_id == shared_by_id:
+            raise ValueError("Impossible de partager un visiteur avec soi-même.")
+        return self.share_visitor_many(visitor, shared_by_id, [shared_with_id], motif=motif)[0]
+
+    def share_visitor_many(self, visitor, shared_by_id, shared_with_ids=(), structure=None, motif=None) -> list[int]:
+        """
+        Partage un visiteur avec plusieurs collègues en une seule transaction.
+        L'image est lue et stockée une seule fois (BlobStore), référencée par
+        tous les partages, qui sont insérés en un seul lot.
+
+        Args:
+            shared_with_ids : identifiants des destinataires
+            structure : partage aussi avec tous les membres de cette structure
+        Returns:
+            les identifiants des partages créés
+        """
         session = self.session
         try:
-            # Lire l’image sur disque
-            with open(visitor.image_path, "rb") as f:
-                img = f.read()
-
-            share = VisitorShare(
-                visitor_id=visitor.id,
-                shared_by_user_id=shared_by_id,
-                shared_with_user_id=shared_with_id,
-                place_of_birth=visitor.place_of_birth,
-                phone_number=visitor.phone_number,
-                motif=motif or visitor.motif,
-                image_data=img,
-            )
-            self.session.add(share)
-            self.session.commit()
-            return share.id
+            destinataires = set(shared_with_ids)
+            if structure is not None:
+                destinataires.update(session.scalars(select(User.id).where(User.structure == structure)))
+            destinataires.discard(shared_by_id)
+            if not destinataires:
+                return []
+
+            cle = self.blobs.stocker_fichier(session, visitor.image_path, references=len(destinataires))
+            ids = session.scalars(
+                insert(VisitorShare).returning(VisitorShare.id),
+                [
+                    {
+                        "visitor_id": visitor.id,
+                        "shared_by_user_id": shared_by_id,
+                        "shared_with_user_id": destinataire,
+                        "place_of_birth": visitor.place_of_birth,
+                        "phone_number": visitor.phone_number,
+                        "motif": motif or visitor.motif,
+                        "blob_hash": cle,
+                    }
+                    for destinataire in sorted(destinataires)
+                ],
+            ).all()
+            session.commit()
+            return ids
         except:
             session.rollback()
             raise 
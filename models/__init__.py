@@ -1,3 +1,5 @@
 from .user import User, PasswordResetToken, VisitorShare
 from .visitor import Visitor
-from .documentshare import DocumentShare
\ No newline at end of file
+from .documentshare import DocumentShare
+from .blob import Blob, BlobChunk
+from .inbox import ShareInboxItem
\ No newline at end of file
@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, LargeBinary, String, func
+from models.user import Base
+
+
+class Blob(Base):
+    """
+    Contenu partagé (image de visiteur, document) stocké une seule fois,
+    identifié par son empreinte SHA-256 (calculée sur le contenu d'origine).
+    `ref_count` compte les partages qui pointent vers lui ; `codec` indique
+    comment ses morceaux sont compressés (voir helpers.compression).
+    """
+    __tablename__ = "blobs"
+    hash = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+    codec = Column(String(8), nullable=False, default="raw", server_default="raw")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BlobChunk(Base):
+    """Morceau d'un contenu ; les morceaux se relisent dans l'ordre de `seq`."""
+    __tablename__ = "blob_chunks"
+    blob_hash = Column(String(64), ForeignKey("blobs.hash", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
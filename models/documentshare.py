@@ -1,14 +1,27 @@
-from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, LargeBinary, ForeignKey, CheckConstraint, Index
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from models.user import Base
 
 class DocumentShare(Base):
     __tablename__ = "document_shares"
+    __table_args__ = (
+        CheckConstraint("shared_by_user_id != shared_to_user_id", name="no_self_share_doc"),
+        Index("idx_document_shares_user_id_id", "shared_to_user_id", "id"),
+        Index("idx_document_shares_blob_hash", "blob_hash"),
+    )
     id = Column(Integer, primary_key=True)
-    shared_by_user_id = Column(Integer)
-    shared_to_user_id = Column(Integer)
-    file = Column(LargeBinary)
+    shared_by_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    shared_to_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Ancien stockage en un seul bloc, lu seulement pour les documents d'avant le stockage par morceaux
+    file = deferred(Column(LargeBinary))
+    file_size = Column(BigInteger)
+    # Contenu dédupliqué (table blobs)
+    blob_hash = Column(String(64), ForeignKey("blobs.hash"))
     file_name = Column(String)
     document_type = Column(String)
     shared_at = Column(DateTime, default=datetime.now)
-    status = Column(String, default="active")
\ No newline at end of file
+    status = Column(String, default="active")
+
+    shared_by = relationship("User", foreign_keys=[shared_by_user_id])
+
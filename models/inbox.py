@@ -0,0 +1,23 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(frozen=True)
+class ShareInboxItem:
+    """
+    Partage reçu, prêt à afficher : expéditeur déjà résolu et aucune colonne binaire.
+    Construit par les requêtes `get_inbox_for_user` des managers.
+    """
+    id: int
+    type: str  # "visiteur" ou "document"
+    shared_by_user_id: int
+    expediteur_nom: str | None
+    expediteur_prenom: str | None
+    shared_at: datetime
+    status: str
+    document_type: str | None = None
+    file_name: str | None = None
+
+    @property
+    def expediteur(self) -> str:
+        return f"{self.expediteur_prenom or ''} {self.expediteur_nom or ''}".strip()
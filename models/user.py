@@ -8,10 +8,12 @@ from sqlalchemy import (
     ForeignKey,
     LargeBinary,
     Text,
+    CheckConstraint,
+    Index,
     func
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from passlib.hash import argon2
 import secrets
 
@@ -78,14 +80,24 @@ class PasswordResetToken(Base):
 
 class VisitorShare(Base):
     __tablename__ = "visitor_shares"
+    __table_args__ = (
+        CheckConstraint("shared_by_user_id != shared_with_user_id", name="no_self_share"),
+        Index("idx_visitor_shares_visitor_id", "visitor_id"),
+        # Boîte de réception et recherche incrémentale (id > dernier repère)
+        Index("idx_visitor_shares_user_id_id", "shared_with_user_id", "id"),
+        Index("idx_visitor_shares_blob_hash", "blob_hash"),
+    )
     id                   = Column(Integer, primary_key=True)
-    visitor_id           = Column(Integer, nullable=False, index=True)
-    shared_by_user_id    = Column(Integer, ForeignKey("users.id"), nullable=False)
-    shared_with_user_id  = Column(Integer, ForeignKey("users.id"), nullable=False)
+    visitor_id           = Column(Integer, ForeignKey("visitors.id", ondelete="CASCADE"), nullable=False)
+    shared_by_user_id    = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    shared_with_user_id  = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     place_of_birth       = Column(String, nullable=False)
     phone_number         = Column(String, nullable=False)
     motif                = Column(Text)
-    image_data           = Column(LargeBinary, nullable=False)
+    # Ancien stockage de l'image, lu seulement pour les partages d'avant la table blobs
+    image_data           = deferred(Column(LargeBinary))
+    # Image dédupliquée (table blobs)
+    blob_hash            = Column(String(64), ForeignKey("blobs.hash"))
     shared_at            = Column(DateTime(timezone=True), server_default=func.now())
     status               = Column(String, default="active", nullable=False)
 
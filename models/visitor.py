@@ -1,19 +1,23 @@
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Text
+    Column, Integer, String, Text, Date, Time, Index
 )
 from models.user import Base
        
 class Visitor(Base):
     __tablename__ = "visitors"
+    __table_args__ = (
+        # Les filtres année/mois/jour deviennent des parcours d'intervalle sur cet index
+        Index("idx_visitors_date", "date"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     image_path = Column(Text, nullable=False)
     phone_number = Column(String, nullable=False)
     place_of_birth = Column(String, nullable=False)
     motif = Column(String, nullable=False)
-    date = Column(String, nullable=False, default=datetime.now().date().isoformat())
-    arrival_time = Column(String, nullable=False, default=datetime.now().strftime("%H:%M"))
+    date = Column(Date, nullable=False, default=lambda: datetime.now().date())
+    arrival_time = Column(Time, nullable=False, default=lambda: datetime.now().time().replace(second=0, microsecond=0))
     exit_time = Column(String, nullable=True)
     observation = Column(Text, nullable=True)
 
@@ -25,8 +29,8 @@ class Visitor(Base):
             "phone_number": self.phone_number,
             "place_of_birth": self.place_of_birth,
             "motif": self.motif,
-            "date": self.date,
-            "arrival_time": self.arrival_time,
+            "date": self.date.isoformat() if self.date else None,
+            "arrival_time": self.arrival_time.strftime("%H:%M") if self.arrival_time else None,
             "exit_time": self.exit_time,
             "observation": self.observation
         }
@@ -35,4 +39,4 @@ class Visitor(Base):
         self.exit_time = time
 
     def set_observation(self, observation):
-        self.observation = observation
\ No newline at end of file
+        self.observation = observation